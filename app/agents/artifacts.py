@@ -0,0 +1,47 @@
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Tuple
+from app.agents.pipeline import CODE_ARTIFACTS, submit_code_artifacts
+
+
+def start_stage4_artifacts(session_state, session_id: str, data: Dict[str, Any],
+                           done: Optional[Dict[str, Any]] = None) -> Dict[str, Future]:
+    """Start every stage-4 artifact in the background, once per session.
+
+    Futures live in ``session_state['stage4_artifacts'][session_id]``; calling this
+    again for the same session returns the existing futures instead of new work.
+    ``done`` holds results that already exist (e.g. a restored session); only the
+    missing artifacts are computed.
+    """
+    engine = session_state.setdefault('stage4_artifacts', {})
+    if session_id not in engine:
+        futures = {}
+        for name, result in (done or {}).items():
+            if name in CODE_ARTIFACTS and result is not None:
+                futures[name] = Future()
+                futures[name].set_result(result)
+        missing = [name for name in CODE_ARTIFACTS if name not in futures]
+        if missing:
+            futures.update(submit_code_artifacts(data, missing))
+        engine[session_id] = futures
+    return engine[session_id]
+
+
+def get_stage4_artifact(session_state, session_id: str, name: str) -> Tuple[bool, Optional[Any], Optional[str]]:
+    """(ready, result, error) for one artifact; never blocks and never starts work"""
+    future = session_state.get('stage4_artifacts', {}).get(session_id, {}).get(name)
+    if future is None or not future.done():
+        return False, None, None
+    try:
+        return True, future.result(), None
+    except Exception as e:
+        return True, None, str(e)
+
+
+def discard_stage4_artifacts(session_state, session_id: str):
+    """Forget a session's artifacts (e.g. stage 3 was resubmitted) so the next start recomputes them"""
+    session_state.get('stage4_artifacts', {}).pop(session_id, None)
+
+
+def pending_stage4_artifacts(session_state, session_id: str) -> Dict[str, Future]:
+    futures = session_state.get('stage4_artifacts', {}).get(session_id, {})
+    return {name: future for name, future in futures.items() if not future.done()}
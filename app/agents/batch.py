@@ -0,0 +1,204 @@
+"""
+Batch agent generation from a JSONL file of objectives.
+
+Each input line is ``{"objective": "...", "id": "...", "answers": [...]}``; ``id`` and
+``answers`` are optional. ``answers`` are canned follow-up answers, either a list
+in question order or a ``{"question index": answer}`` mapping. Every objective runs
+the full pipeline (skill -> subtasks -> questions -> refined objective -> code) and
+gets its own bundle directory. Progress is checkpointed to SQLite, so rerunning the
+same command after a crash skips objectives that already finished.
+
+    python -m app.agents.batch objectives.jsonl --out batch_out --workers 4 --executor process
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+CHECKPOINT_DB_NAME = "batch_checkpoint.db"
+
+
+def read_objectives(path: str) -> Iterator[Dict[str, Any]]:
+    """Parse the input JSONL, giving every objective a stable id"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if not item.get("objective"):
+                logger.warning(f"Skipping line {line_no}: no objective")
+                continue
+            if not item.get("id"):
+                item["id"] = hashlib.sha256(item["objective"].encode("utf-8")).hexdigest()[:12]
+            item["id"] = str(item["id"])
+            yield item
+
+
+def normalize_answers(answers) -> Dict[int, str]:
+    """Canned answers as the {question index: answer} mapping the pipeline uses"""
+    if not answers:
+        return {}
+    if isinstance(answers, list):
+        return {i: str(answer) for i, answer in enumerate(answers) if answer}
+    return {int(i): str(answer) for i, answer in answers.items() if answer}
+
+
+def bundle_dir_name(objective_id: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', objective_id)[:80] or "objective"
+
+
+def write_bundle(state: Dict[str, Any], bundle_dir: str):
+    """agent.py, explanation.md and the remaining state as bundle.json"""
+    os.makedirs(bundle_dir, exist_ok=True)
+    with open(os.path.join(bundle_dir, "agent.py"), "w", encoding="utf-8") as f:
+        f.write(state.get('generated_code') or "")
+
+    explanation = state.get('code_explanation') or {}
+    with open(os.path.join(bundle_dir, "explanation.md"), "w", encoding="utf-8") as f:
+        for section, content in explanation.items():
+            f.write(f"## {section.title()}\n\n{str(content).strip()}\n\n")
+
+    metadata = {k: v for k, v in state.items() if k not in ('generated_code', 'code_explanation')}
+    with open(os.path.join(bundle_dir, "bundle.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, default=str)
+
+
+def process_objective(item: Dict[str, Any], output_dir: str) -> Tuple[str, str, float]:
+    """Run the pipeline for one objective and write its bundle; (id, bundle dir, seconds).
+
+    Top-level so process pools can pickle it.
+    """
+    from app.agents.graph import run_pipeline
+
+    started = time.perf_counter()
+    answers = normalize_answers(item.get("answers"))
+    state = run_pipeline(
+        item["objective"],
+        answer_questions=lambda state: answers,
+        state={'session_id': f"batch_{item['id']}", 'agent_name': item.get("agent_name", "MultiAgent")}
+    )
+    bundle_dir = os.path.join(output_dir, bundle_dir_name(item["id"]))
+    write_bundle(state, bundle_dir)
+    return item["id"], bundle_dir, time.perf_counter() - started
+
+
+class BatchCheckpoint:
+    """Per-objective status in SQLite; written only from the coordinating thread"""
+
+    def __init__(self, db_path: str):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS batch_runs (
+                objective_id TEXT PRIMARY KEY,
+                objective TEXT,
+                status TEXT,
+                bundle_dir TEXT,
+                error TEXT,
+                elapsed_seconds REAL,
+                finished_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.commit()
+
+    def finished_ids(self, include_failed: bool = False) -> set:
+        statuses = ('done', 'failed') if include_failed else ('done',)
+        rows = self.conn.execute(
+            f"SELECT objective_id FROM batch_runs WHERE status IN ({','.join('?' * len(statuses))})",
+            statuses
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def record(self, objective_id: str, objective: str, status: str, bundle_dir: Optional[str] = None,
+               error: Optional[str] = None, elapsed_seconds: Optional[float] = None):
+        self.conn.execute('''
+            INSERT OR REPLACE INTO batch_runs
+            (objective_id, objective, status, bundle_dir, error, elapsed_seconds)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (objective_id, objective, status, bundle_dir, error, elapsed_seconds))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def run_batch(input_path: str, output_dir: str, workers: int = BATCH_WORKERS, executor: str = "thread",
+              checkpoint_db: Optional[str] = None, retry_failed: bool = True) -> Dict[str, Any]:
+    """Process every objective not yet checkpointed as done; returns run statistics"""
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = BatchCheckpoint(checkpoint_db or os.path.join(output_dir, CHECKPOINT_DB_NAME))
+    skip = checkpoint.finished_ids(include_failed=not retry_failed)
+
+    items: List[Dict[str, Any]] = []
+    seen = set()
+    for item in read_objectives(input_path):
+        if item["id"] in skip or item["id"] in seen:
+            continue
+        seen.add(item["id"])
+        items.append(item)
+    logger.info(f"{len(items)} objectives to process ({len(skip)} already checkpointed), "
+                f"{workers} {executor} workers")
+
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    done = failed = 0
+    started = time.perf_counter()
+    try:
+        with pool_class(max_workers=workers) as pool:
+            futures = {pool.submit(process_objective, item, output_dir): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    objective_id, bundle_dir, elapsed = future.result()
+                    checkpoint.record(objective_id, item["objective"], "done", bundle_dir,
+                                      elapsed_seconds=elapsed)
+                    done += 1
+                    minutes = (time.perf_counter() - started) / 60
+                    logger.info(f"[{done + failed}/{len(items)}] {item['id']} done - "
+                                f"{done / minutes if minutes else 0.0:.2f} objectives/min")
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"[{done + failed}/{len(items)}] {item['id']} failed: {e}")
+                    checkpoint.record(item["id"], item["objective"], "failed", error=str(e))
+    finally:
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": done,
+        "failed": failed,
+        "skipped": len(skip),
+        "elapsed_seconds": round(elapsed, 2),
+        "objectives_per_minute": round(done / (elapsed / 60), 2) if elapsed and done else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate agents for a JSONL file of objectives")
+    parser.add_argument("input", help="JSONL with one {\"objective\": ...} per line")
+    parser.add_argument("--out", default="batch_out", help="directory for bundles and the checkpoint DB")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--checkpoint-db", default=None)
+    parser.add_argument("--skip-failed", action="store_true",
+                        help="do not retry objectives that failed in an earlier run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stats = run_batch(args.input, args.out, args.workers, args.executor,
+                      args.checkpoint_db, retry_failed=not args.skip_failed)
+    print(json.dumps(stats, indent=2))
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
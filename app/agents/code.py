@@ -1,3 +1,4 @@
+from typing import List, Optional
 from app.agents.state import AgentState
 from app.rag.analyse_files import analyze_file_requirements
 from app.ui.components import identify_ui_components
@@ -8,13 +9,25 @@ from app.rag.analyse_files import analyze_file_requirements
 from app.ui.components import identify_ui_components
 
 
-def generate_production_code(state: AgentState) -> str:
+def extract_file_requirements(answers, goal: str) -> List[str]:
+    """File names the requirements mention (one LLM call)"""
+    file_reqs = analyze_file_requirements(answers, goal)
+    return [
+        f for f in file_reqs
+        if "." in f and not f.strip().startswith("<") and " " not in f.strip()
+    ]
+
+
+def generate_production_code(state: AgentState, file_reqs: Optional[List[str]] = None) -> str:
     """
     Code generator agent.
     Generates a minimal, ready-to-run Python script with:
       - File agent for processing uploaded/mentioned files
       - Subtask execution
       - Workflow orchestration
+
+    ``file_reqs`` may be passed in precomputed (see app/agents/incremental.py);
+    otherwise it is built here.
     """
 
     subtasks = state.get("subtasks", [])
@@ -23,11 +36,8 @@ def generate_production_code(state: AgentState) -> str:
     goal = state.get("goal", "")
 
     # Collect files from input + subtasks answers
-    file_reqs = analyze_file_requirements(answers, goal)
-    file_reqs = [
-        f for f in file_reqs
-        if "." in f and not f.strip().startswith("<") and " " not in f.strip()
-    ]
+    if file_reqs is None:
+        file_reqs = extract_file_requirements(answers, goal)
 
     state_fields = [f"    step_{i+1}_result: Optional[Any]" for i in range(len(subtasks))]
     additional_fields = [
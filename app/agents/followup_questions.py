@@ -1,16 +1,30 @@
-from app.utils.constants import llm_invoke
-from typing import List, Dict, Any
+from app.utils.constants import llm_invoke, llm_stream, iter_numbered_items, submit_llm_task
+from app.utils.storage import (
+    get_connection, register_schema, enqueue_write, flush_writes, create_fts_index, search_records
+)
+from app.utils.blob_store import blob_hash, get_blob_text, put_blob
+from app.utils.retention import FOLLOWUP_DB
+from app.rag.analyse_files import read_file_bytes
+from app.utils.token_budget import (
+    count_tokens, compress_text, fit_files,
+    QUESTION_FILE_BUDGET, REFINE_CONTEXT_BUDGET, INTEGRATION_FILE_BUDGET
+)
+from typing import List, Dict, Any, Callable, Optional
 import re
 import logging
 import streamlit as st
 import sqlite3
-import pandas as pd
 import json
 import os
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from io import StringIO
 
 logger = logging.getLogger(__name__)
 
+# How long stage 3 waits on a running prefetch before generating the questions itself
+FOLLOWUP_PREFETCH_TIMEOUT_SECONDS = float(os.getenv("FOLLOWUP_PREFETCH_TIMEOUT_SECONDS", "30"))
+
 def handle_errors():
     """Decorator for error handling"""
     def decorator(func):
@@ -114,9 +128,11 @@ def get_default_questions(skill_level: str) -> List[str]:
     
     return defaults.get(skill_level.lower(), defaults["intermediate"])
 
-def init_followup_db():
-    """Initialize SQLite database for follow-up questions and files"""
-    conn = sqlite3.connect('followup_data.db')
+# Text columns covered by the followup_sessions full-text index
+FOLLOWUP_SEARCH_COLUMNS = ('objective', 'refined_objective', 'questions', 'answers')
+
+def _create_followup_tables(conn: sqlite3.Connection):
+    """Create the follow-up tables; run once per process by the storage layer"""
     cursor = conn.cursor()
     
     # Create followup_sessions table
@@ -146,22 +162,37 @@ def init_followup_db():
             FOREIGN KEY (session_id) REFERENCES followup_sessions (session_id)
         )
     ''')
+    # File bytes and text live in the blob store; rows keep only its SHA-256 reference
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(uploaded_files)")}
+    if 'content_sha256' not in existing_columns:
+        cursor.execute("ALTER TABLE uploaded_files ADD COLUMN content_sha256 TEXT")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_uploaded_files_content_sha256 ON uploaded_files (content_sha256)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_uploaded_files_upload_time ON uploaded_files (upload_time)')
     
-    conn.commit()
-    return conn
+    # session_id lookups are covered by its UNIQUE index; these serve time-range and per-session queries
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_followup_sessions_created_at ON followup_sessions (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_uploaded_files_session_id ON uploaded_files (session_id)')
+    create_fts_index(conn, 'followup_sessions', FOLLOWUP_SEARCH_COLUMNS)
+
+register_schema(FOLLOWUP_DB, _create_followup_tables)
+
+def init_followup_db():
+    """The process-wide shared connection to the follow-up database (do not close it)"""
+    return get_connection(FOLLOWUP_DB)
 
 def save_followup_session(session_id: str, objective: str, skill_level: str,
                          questions: List[str], answers: Dict[int, str] = None,
                          refined_objective: str = None):
-    """Save follow-up session to database"""
-    conn = init_followup_db()
-    cursor = conn.cursor()
-    
+    """Save follow-up session to database (written in the background; see flush_writes)"""
     try:
-        cursor.execute('''
-            INSERT OR REPLACE INTO followup_sessions
+        enqueue_write(FOLLOWUP_DB, '''
+            INSERT INTO followup_sessions
             (session_id, objective, skill_level, questions, answers, refined_objective)
             VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                objective = excluded.objective, skill_level = excluded.skill_level,
+                questions = excluded.questions, answers = excluded.answers,
+                refined_objective = excluded.refined_objective
         ''', (
             session_id,
             objective,
@@ -170,39 +201,142 @@ def save_followup_session(session_id: str, objective: str, skill_level: str,
             json.dumps(answers) if answers else None,
             refined_objective
         ))
-        conn.commit()
-        logger.info(f"Saved follow-up session: {session_id}")
+        logger.info(f"Queued follow-up session save: {session_id}")
     except Exception as e:
         logger.error(f"Error saving follow-up session: {e}")
-    finally:
-        conn.close()
 
-def save_uploaded_file(session_id: str, file_data: Dict[str, Any]):
-    """Save uploaded file information to database"""
+def load_followup_questions(session_id: str, objective: str, skill_level: str) -> Optional[List[str]]:
+    """Questions already generated for this session, objective and skill level, if any"""
+    flush_writes()
     conn = init_followup_db()
     cursor = conn.cursor()
     
     try:
         cursor.execute('''
+            SELECT questions FROM followup_sessions
+            WHERE session_id = ? AND objective = ? AND skill_level = ?
+        ''', (session_id, objective, skill_level))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+    except Exception as e:
+        logger.error(f"Error loading follow-up session: {e}")
+        return None
+
+def search_followup_sessions(keywords: str = "", since: Optional[str] = None, until: Optional[str] = None,
+                             limit: int = 50) -> List[Dict[str, Any]]:
+    """Follow-up sessions whose objective, refined objective, questions or answers match ``keywords``"""
+    try:
+        return search_records(FOLLOWUP_DB, 'followup_sessions',
+                              ('session_id', 'objective', 'refined_objective', 'skill_level', 'created_at'),
+                              FOLLOWUP_SEARCH_COLUMNS, keywords, since, until, limit=limit)
+    except Exception as e:
+        logger.error(f"Error searching follow-up sessions: {e}")
+        return []
+
+def get_or_generate_followup_questions(session_id: str, objective: str, skill_level: str,
+                                       on_question: Optional[Callable[[str], None]] = None) -> List[str]:
+    """Follow-up questions for (session, objective, skill level), generated at most once.
+
+    Memoized in ``st.session_state`` and in the followup_sessions table, so Streamlit
+    reruns of stage 3 render the same questions without an LLM call or DB write.
+    """
+    key = (session_id, objective, skill_level)
+    memo = st.session_state.setdefault('followup_questions', {})
+    if key in memo:
+        return memo[key]
+
+    questions = _take_prefetched_questions(session_id, key)
+    if questions is not None:
+        save_followup_session(session_id, objective, skill_level, questions)
+    else:
+        questions = load_followup_questions(session_id, objective, skill_level)
+    if questions is None:
+        def progress(step, event, payload):
+            if on_question and event == "item":
+                on_question(payload)
+        questions = _pipeline_questions(objective, skill_level, progress if on_question else None)
+        save_followup_session(session_id, objective, skill_level, questions)
+    memo[key] = questions
+    return questions
+
+def _pipeline_questions(objective: str, skill_level: str, progress=None) -> List[str]:
+    """Follow-up questions from the pipeline's ``questions`` step"""
+    from app.agents.pipeline import generate_questions  # deferred: pipeline imports this module
+    state = {'goal': objective, 'user_skill_level': skill_level, 'uploaded_files': []}
+    return generate_questions(state, progress)['followup_questions']
+
+def prefetch_followup_questions(session_id: str, objective: str, skill_level: str):
+    """Speculatively start generating follow-up questions in the background.
+
+    Called while the user reviews subtasks; stage 3 picks the result up through
+    get_or_generate_followup_questions if the objective and skill level are
+    unchanged. A prefetch for different inputs replaces the previous one.
+    """
+    key = (session_id, objective, skill_level)
+    if not objective or key in st.session_state.get('followup_questions', {}):
+        return
+    prefetches = st.session_state.setdefault('followup_prefetch', {})
+    current = prefetches.get(session_id)
+    if current and current[0] == key:
+        return
+    if current:
+        current[1].cancel()
+    prefetches[session_id] = (key, submit_llm_task(_pipeline_questions, objective, skill_level))
+
+def _take_prefetched_questions(session_id: str, key: tuple) -> Optional[List[str]]:
+    """Prefetched questions for ``key``, waiting up to FOLLOWUP_PREFETCH_TIMEOUT_SECONDS if still running.
+
+    Stale, failed or timed-out prefetches return None so the caller generates inline.
+    """
+    prefetched = st.session_state.get('followup_prefetch', {}).pop(session_id, None)
+    if not prefetched:
+        return None
+    prefetched_key, future = prefetched
+    if prefetched_key != key:
+        future.cancel()
+        logger.info(f"Discarded follow-up question prefetch for changed inputs: {session_id}")
+        return None
+    try:
+        return future.result(timeout=FOLLOWUP_PREFETCH_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning(f"Follow-up question prefetch timed out after {FOLLOWUP_PREFETCH_TIMEOUT_SECONDS}s: {session_id}")
+        return None
+    except Exception as e:
+        logger.error(f"Follow-up question prefetch failed: {e}")
+        return None
+
+def save_uploaded_file(session_id: str, file_data: Dict[str, Any]):
+    """Save uploaded file information to database (written in the background; see flush_writes).
+
+    The content itself is stored once in the blob store; the row keeps its reference.
+    """
+    try:
+        content_sha256 = file_data.get('content_sha256')
+        if not content_sha256:
+            content = file_data.get('content') or ''
+            content_sha256 = put_blob(content.encode('utf-8'), content)
+        enqueue_write(FOLLOWUP_DB, '''
             INSERT INTO uploaded_files
-            (session_id, filename, file_type, file_size, file_content)
+            (session_id, filename, file_type, file_size, content_sha256)
             VALUES (?, ?, ?, ?, ?)
         ''', (
             session_id,
             file_data['filename'],
             file_data['file_type'],
             file_data['file_size'],
-            file_data['content'][:10000]  # Limit content size
+            content_sha256
         ))
-        conn.commit()
-        logger.info(f"Saved uploaded file: {file_data['filename']}")
+        logger.info(f"Queued uploaded file save: {file_data['filename']}")
     except Exception as e:
         logger.error(f"Error saving uploaded file: {e}")
-    finally:
-        conn.close()
 
 def process_uploaded_file(uploaded_file):
-    """Process uploaded file and return structured data"""
+    """Process uploaded file and return structured data.
+
+    The full bytes and the extracted text go to the blob store (``content_sha256``);
+    a file whose text was already extracted, in any session, is not parsed again.
+    """
     if uploaded_file is None:
         return None
     
@@ -210,12 +344,23 @@ def process_uploaded_file(uploaded_file):
         'filename': uploaded_file.name,
         'file_type': uploaded_file.type,
         'file_size': uploaded_file.size,
-        'content': ''
+        'content': '',
+        'content_sha256': None
     }
     
+    data = None
     try:
+        data = read_file_bytes(uploaded_file)
+        # Committed rows only: a file still in the write-behind queue is just parsed again
+        stored_text = get_blob_text(blob_hash(data))
+        if stored_text is not None:
+            file_data['content'] = stored_text
+            file_data['content_sha256'] = put_blob(data, stored_text)
+            return file_data
+        
         if uploaded_file.type == 'text/csv':
             # Process CSV file
+            import pandas as pd
             df = pd.read_csv(uploaded_file)
             file_data['content'] = df.to_string(index=False)
             file_data['processed_data'] = df.to_dict('records')
@@ -230,6 +375,7 @@ def process_uploaded_file(uploaded_file):
             file_data['content'] = content
         elif uploaded_file.name.endswith('.xlsx'):
             # Process Excel file
+            import pandas as pd
             df = pd.read_excel(uploaded_file)
             file_data['content'] = df.to_string(index=False)
             file_data['processed_data'] = df.to_dict('records')
@@ -240,22 +386,31 @@ def process_uploaded_file(uploaded_file):
                 file_data['content'] = content
             except:
                 file_data['content'] = f"Binary file: {uploaded_file.name}"
-                
+        
+        file_data['content_sha256'] = put_blob(data, file_data['content'])
         return file_data
         
     except Exception as e:
         logger.error(f"Error processing file {uploaded_file.name}: {e}")
         file_data['content'] = f"Error processing file: {str(e)}"
+        if data is not None:
+            file_data['content_sha256'] = put_blob(data)
         return file_data
 
 def generate_followup_questions_with_files(objective: str, skill_level: str = "intermediate",
-                                          uploaded_files: List[Dict] = None) -> List[str]:
-    """Generate follow-up questions considering uploaded files"""
+                                          uploaded_files: List[Dict] = None,
+                                          on_question: Optional[Callable[[str], None]] = None) -> List[str]:
+    """Generate follow-up questions considering uploaded files.
+
+    When ``on_question`` is given the response is streamed and each question is
+    passed to it as soon as its numbered line is complete.
+    """
     file_context = ""
     if uploaded_files:
         file_info = []
-        for file_data in uploaded_files:
-            file_info.append(f"- {file_data['filename']} ({file_data['file_type']}): {file_data['content'][:200]}...")
+        budgeted = fit_files(uploaded_files, QUESTION_FILE_BUDGET)
+        for file_data, (_, content) in zip(uploaded_files, budgeted):
+            file_info.append(f"- {file_data['filename']} ({file_data['file_type']}): {content}")
         file_context = f"\n\nUPLOADED FILES:\n" + "\n".join(file_info)
     
     skill_template = get_skill_based_question_template(skill_level)
@@ -289,17 +444,26 @@ Make each question specific, actionable, and directly relevant to achieving the
 """
 
     try:
-        response = llm_invoke(prompt)
-        questions = []
-        
-        for line in response.split('\n'):
-            line = line.strip()
-            if line and re.match(r'^\d+\.', line):
-                question = re.sub(r'^\d+\.\s*', '', line).strip()
-                if question and len(question) > 10:
+        if on_question:
+            questions = []
+            for question in iter_numbered_items(llm_stream(prompt)):
+                if len(question) > 10 and len(questions) < 5:
                     if not question.endswith('?'):
                         question += '?'
                     questions.append(question)
+                    on_question(question)
+        else:
+            response = llm_invoke(prompt)
+            questions = []
+            
+            for line in response.split('\n'):
+                line = line.strip()
+                if line and re.match(r'^\d+\.', line):
+                    question = re.sub(r'^\d+\.\s*', '', line).strip()
+                    if question and len(question) > 10:
+                        if not question.endswith('?'):
+                            question += '?'
+                        questions.append(question)
         
         # Ensure exactly 5 questions
         if len(questions) < 5:
@@ -399,13 +563,21 @@ def render_followup_questions_with_upload(objective: str, skill_level: str = "in
     """Enhanced follow-up questions interface with collapsible file upload and DB setup"""
     
     if not session_id:
-        session_id = f"session_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}"
+        session_id = f"session_{uuid.uuid4().hex}"
     
     processed_files = []
     
-    # Generate questions
-    questions = generate_followup_questions_with_files(objective, skill_level, processed_files)
-    save_followup_session(session_id, objective, skill_level, questions)
+    # Generate questions once, showing each one as soon as it is streamed in
+    live_questions = st.empty()
+    streamed_questions = []
+
+    def _show_question(question: str):
+        streamed_questions.append(question)
+        live_questions.markdown("\n".join(f"{i+1}. {q}" for i, q in enumerate(streamed_questions)))
+
+    questions = get_or_generate_followup_questions(session_id, objective, skill_level,
+                                                   on_question=_show_question)
+    live_questions.empty()
     
     # Display questions with answer, file upload, and database config
     st.write("Please answer these questions to help us better understand your requirements:")
@@ -457,7 +629,8 @@ def render_followup_questions_with_upload(objective: str, skill_level: str = "in
                                         'filename': uploaded_file.name,
                                         'file_type': uploaded_file.type,
                                         'content': file_data['content'],
-                                        'file_size': file_data['file_size']
+                                        'file_size': file_data['file_size'],
+                                        'content_sha256': file_data['content_sha256']
                                     }
                                     question_files.append(file_info)
                                     st.success(f"✅ Processed: {uploaded_file.name}")
@@ -556,10 +729,17 @@ def render_followup_questions_with_upload(objective: str, skill_level: str = "in
                     # Combine all files (general + question-specific)
                     all_files = processed_files + uploaded_files_data
                     
-                    # Generate refined objective with all context
-                    refined_objective = process_followup_answers_with_files(
-                        objective, questions, filtered_answers, skill_level, all_files
-                    )
+                    # Generate refined objective with all context through the pipeline's
+                    # refine step, streaming it as it is written
+                    from app.agents.pipeline import refine_objective  # deferred: pipeline imports this module
+                    live_refined = st.empty()
+                    refined_objective = refine_objective(
+                        {'goal': objective, 'followup_questions': questions,
+                         'followup_answers': filtered_answers, 'user_skill_level': skill_level,
+                         'uploaded_files': all_files},
+                        lambda step, event, text: live_refined.markdown(text) if event == "text" else None
+                    )['refined_goal']
+                    live_refined.empty()
                     
                     # Extract valid database configurations
                     valid_db_configs = []
@@ -592,6 +772,8 @@ def render_followup_questions_with_upload(objective: str, skill_level: str = "in
                     
                     save_followup_session(session_id, objective, skill_level, questions,
                                         filtered_answers, refined_objective)
+                    for file_data in uploaded_files_data:
+                        save_uploaded_file(session_id, file_data)
                     
                     # Display results
                     st.success("✅ Answers submitted successfully!")
@@ -646,8 +828,13 @@ def render_followup_questions_with_upload(objective: str, skill_level: str = "in
 
 def process_followup_answers_with_files(original_objective: str, questions: List[str],
                                       answers: Dict[int, str], skill_level: str,
-                                      uploaded_files: List[Dict] = None) -> str:
-    """Process follow-up answers with file context to create refined objective"""
+                                      uploaded_files: List[Dict] = None,
+                                      on_text: Optional[Callable[[str], None]] = None) -> str:
+    """Process follow-up answers with file context to create refined objective.
+
+    When ``on_text`` is given the response is streamed and the text generated so
+    far is passed to it after every chunk.
+    """
     
     qa_pairs = []
     for i, question in enumerate(questions):
@@ -658,13 +845,15 @@ def process_followup_answers_with_files(original_objective: str, questions: List
     if not qa_pairs:
         return original_objective
     
-    qa_text = "\n\n".join(qa_pairs)
+    # Answers get the budget they need (up to half); files share what is left
+    qa_text = compress_text("\n\n".join(qa_pairs), REFINE_CONTEXT_BUDGET // 2)
     
     file_context = ""
     if uploaded_files:
         file_info = []
-        for file_data in uploaded_files:
-            file_info.append(f"File: {file_data['filename']} - {file_data['content'][:300]}...")
+        file_budget = REFINE_CONTEXT_BUDGET - count_tokens(qa_text) - count_tokens(original_objective)
+        for filename, content in fit_files(uploaded_files, max(file_budget, 0)):
+            file_info.append(f"File: {filename} - {content}")
         file_context = f"\n\nUPLOADED FILES CONTEXT:\n" + "\n".join(file_info)
     
     prompt = f"""Based on the original objective, user answers, and uploaded files, create a comprehensive refined objective.
@@ -688,7 +877,13 @@ Create a refined objective that:
 REFINED OBJECTIVE:"""
 
     try:
-        refined = llm_invoke(prompt)
+        if on_text:
+            refined = ""
+            for chunk in llm_stream(prompt, max_tokens=1024):
+                refined += chunk
+                on_text(refined)
+        else:
+            refined = llm_invoke(prompt, max_tokens=1024)
         return refined.strip() if refined.strip() else original_objective
     except Exception as e:
         logger.error(f"Error processing follow-up answers with files: {e}")
@@ -698,8 +893,8 @@ def generate_file_integration_plan(uploaded_files: List[Dict], refined_objective
     """Generate a plan for how uploaded files should be integrated"""
     
     file_summary = []
-    for file_data in uploaded_files:
-        file_summary.append(f"- {file_data['filename']}: {file_data['content'][:200]}...")
+    for filename, content in fit_files(uploaded_files, INTEGRATION_FILE_BUDGET):
+        file_summary.append(f"- {filename}: {content}")
     
     prompt = f"""Based on the refined objective and uploaded files, create an integration plan.
 
@@ -717,7 +912,7 @@ Create a specific plan for how each file should be used in the solution:
 INTEGRATION PLAN:"""
 
     try:
-        plan = llm_invoke(prompt)
+        plan = llm_invoke(prompt, max_tokens=1024)
         return plan.strip()
     except Exception as e:
         logger.error(f"Error generating integration plan: {e}")
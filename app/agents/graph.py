@@ -0,0 +1,233 @@
+"""
+Dependency graph over ``AgentState`` for the generator pipeline.
+
+Each node declares the state keys it reads and writes; edges follow from which
+node writes a key another node reads. ``GraphRun`` runs every node whose inputs
+are ready at the same time on the LLM thread pool. After ``update()`` changes
+some keys, only the nodes reading those keys and their descendants are marked
+stale. A stale node whose inputs fingerprint the same as last time is not run
+again, and that stops the invalidation there.
+
+langgraph's ``StateGraph`` (used by the generated agents) has no notion of
+invalidating part of a finished run, so this is a small scheduler of its own.
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.agents.state import AgentState
+from app.agents.followup_questions import generate_file_integration_plan
+from app.agents.pipeline import (
+    ProgressCallback,
+    detect_skill,
+    generate_subtasks,
+    generate_questions,
+    refine_objective,
+    build_file_analysis,
+    build_generated_code,
+    build_code_explanation
+)
+from app.utils.constants import submit_llm_task
+
+logger = logging.getLogger(__name__)
+
+NodeFn = Callable[[AgentState, Optional[ProgressCallback]], Dict[str, Any]]
+
+
+class Node:
+    """One pipeline step: ``fn(state, progress)`` reads ``inputs`` and returns ``outputs``.
+
+    ``required`` inputs that nothing in the graph produces must be present in the
+    state (e.g. the user's follow-up answers) before the node can run.
+    """
+
+    def __init__(self, name: str, fn: NodeFn, inputs: Iterable[str], outputs: Iterable[str],
+                 required: Iterable[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.required = tuple(required)
+
+
+class PipelineGraph:
+    """Nodes plus the producer/consumer edges implied by their state keys"""
+
+    def __init__(self, nodes: List[Node]):
+        self.nodes = {node.name: node for node in nodes}
+        self.producers: Dict[str, str] = {}
+        for node in nodes:
+            for key in node.outputs:
+                if key in self.producers:
+                    raise ValueError(f"State key '{key}' is written by both "
+                                     f"'{self.producers[key]}' and '{node.name}'")
+                self.producers[key] = node.name
+        self.parents = {node.name: {self.producers[key] for key in node.inputs if key in self.producers}
+                        for node in nodes}
+        self.children: Dict[str, Set[str]] = {name: set() for name in self.nodes}
+        for name, parents in self.parents.items():
+            for parent in parents:
+                self.children[parent].add(name)
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(parents) for name, parents in self.parents.items()}
+        order = []
+        while remaining:
+            ready = sorted(name for name, parents in remaining.items() if not parents)
+            if not ready:
+                raise ValueError(f"Pipeline graph has a cycle among: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for parents in remaining.values():
+                parents.difference_update(ready)
+        return order
+
+    def descendants(self, names: Iterable[str]) -> Set[str]:
+        """``names`` and every node downstream of them"""
+        seen: Set[str] = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in seen:
+                seen.add(name)
+                stack.extend(self.children[name])
+        return seen
+
+    def readers(self, keys: Iterable[str]) -> Set[str]:
+        keys = set(keys)
+        return {name for name, node in self.nodes.items() if keys.intersection(node.inputs)}
+
+
+def _integration_plan(state: AgentState, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    files = (state.get('uploaded_files') or []) + (state.get('question_specific_files') or [])
+    plan = generate_file_integration_plan(files, state.get('refined_goal') or state.get('goal', '')) if files else ""
+    return {'integration_plan': plan}
+
+
+def _artifact_node(key: str, build: Callable[[AgentState], Any]) -> NodeFn:
+    def run(state: AgentState, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        return {key: build(state)}
+    return run
+
+
+FILE_KEYS = ('uploaded_files', 'question_specific_files')
+
+GENERATOR_GRAPH = PipelineGraph([
+    Node('skill', detect_skill, ['goal'], ['user_skill_level', 'skill_reason']),
+    Node('subtasks', generate_subtasks, ['goal'], ['subtasks']),
+    Node('questions', generate_questions, ['goal', 'user_skill_level', 'uploaded_files'],
+         ['followup_questions']),
+    Node('file_digest', _artifact_node('file_analysis', build_file_analysis),
+         ['followup_answers', *FILE_KEYS], ['file_analysis'], required=['followup_answers']),
+    Node('refined_objective', refine_objective,
+         ['goal', 'user_skill_level', 'followup_questions', 'followup_answers', *FILE_KEYS],
+         ['refined_goal'], required=['followup_answers']),
+    Node('integration_plan', _integration_plan, ['goal', 'refined_goal', *FILE_KEYS], ['integration_plan']),
+    Node('code', _artifact_node('generated_code', build_generated_code),
+         ['agent_name', 'goal', 'subtasks', 'followup_answers', 'refined_goal', *FILE_KEYS],
+         ['generated_code'], required=['followup_answers']),
+    Node('explanation', _artifact_node('code_explanation', build_code_explanation),
+         ['agent_name', 'domain', 'goal', 'subtasks', 'file_analysis'], ['code_explanation']),
+])
+
+
+def fingerprint(state: AgentState, keys: Iterable[str]) -> str:
+    payload = json.dumps([state.get(key) for key in keys], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GraphRun:
+    """Incremental execution of a PipelineGraph over one AgentState"""
+
+    def __init__(self, state: AgentState, graph: PipelineGraph = GENERATOR_GRAPH,
+                 progress: Optional[ProgressCallback] = None):
+        self.graph = graph
+        self.state = state
+        self.progress = progress
+        self.stale: Set[str] = set(graph.nodes)
+        self.fingerprints: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+
+    def update(self, **changes) -> Set[str]:
+        """Set state keys and mark the nodes reading them, plus descendants, stale"""
+        changed = [key for key, value in changes.items() if self.state.get(key) != value]
+        self.state.update(changes)
+        invalidated = self.graph.descendants(self.graph.readers(changed))
+        self.stale |= invalidated
+        return invalidated
+
+    def _blocked(self, node: Node) -> bool:
+        return any(self.state.get(key) is None for key in node.required if key not in self.graph.producers)
+
+    def _ready(self, name: str, running: Dict[Future, Tuple[str, str]]) -> bool:
+        if name not in self.stale or name in self.errors or name in {n for n, _ in running.values()}:
+            return False
+        if self.graph.parents[name] & (self.stale | set(self.errors)):
+            return False
+        return not self._blocked(self.graph.nodes[name])
+
+    def run(self) -> Dict[str, Any]:
+        """Run stale nodes until nothing more is runnable; returns the state keys that changed.
+
+        Nodes still stale afterwards are blocked on a required input or a failed parent.
+        """
+        self.errors = {}
+        changed: Dict[str, Any] = {}
+        running: Dict[Future, Tuple[str, str]] = {}
+        while True:
+            for name in self.graph.order:
+                if not self._ready(name, running):
+                    continue
+                node = self.graph.nodes[name]
+                node_fingerprint = fingerprint(self.state, node.inputs)
+                if self.fingerprints.get(name) == node_fingerprint:
+                    # Inputs came out identical; descendants keep their results too
+                    self.stale.discard(name)
+                    continue
+                running[submit_llm_task(node.fn, dict(self.state), self.progress)] = (name, node_fingerprint)
+            if not running:
+                return changed
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, node_fingerprint = running.pop(future)
+                try:
+                    updates = future.result()
+                except Exception as e:
+                    logger.error(f"Pipeline node '{name}' failed: {e}")
+                    self.errors[name] = str(e)
+                    continue
+                new_keys = {key: value for key, value in updates.items() if self.state.get(key) != value}
+                self.state.update(updates)
+                changed.update(new_keys)
+                self.fingerprints[name] = node_fingerprint
+                self.stale.discard(name)
+
+
+AnswerProvider = Callable[[AgentState], Dict[int, str]]
+
+
+def run_pipeline(objective: str, answer_questions: Optional[AnswerProvider] = None,
+                 progress: Optional[ProgressCallback] = None,
+                 state: Optional[AgentState] = None) -> AgentState:
+    """Run the whole generator graph for ``objective`` and return the final state.
+
+    ``answer_questions(state)`` supplies the follow-up answers ({question index: answer})
+    once the questions exist; without it the questions go unanswered and the refined
+    objective falls back to the original one.
+    """
+    state = AgentState(**(state or {}))
+    state.setdefault('domain', "AI Assistant")
+    state['goal'] = objective
+
+    graph_run = GraphRun(state, progress=progress)
+    graph_run.run()  # skill, subtasks and questions; the rest waits for the answers
+    graph_run.update(followup_answers=answer_questions(state) if answer_questions else {})
+    graph_run.run()
+    if graph_run.errors:
+        raise RuntimeError("; ".join(f"{name}: {error}" for name, error in graph_run.errors.items()))
+    return state
@@ -0,0 +1,51 @@
+"""
+Incremental regeneration of the generated code.
+
+The per-step agent functions and explanation entries are plain string
+formatting, so they are rebuilt on every run. The one LLM-backed piece, the
+file requirements, is fingerprinted over exactly the inputs it reads (answers
+and goal) and kept in a process-wide bounded cache, so a subtask edit
+re-renders the script without calling the LLM again.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List
+
+from app.agents.state import AgentState
+from app.agents.code import extract_file_requirements, generate_production_code
+from app.utils.lru_cache import BoundedLRUCache
+
+INCREMENTAL_CACHE_MAX_ENTRIES = int(os.getenv("INCREMENTAL_CACHE_MAX_ENTRIES", "1024"))
+
+_PIECES = BoundedLRUCache(INCREMENTAL_CACHE_MAX_ENTRIES)
+
+
+def artifact_fingerprint(kind: str, *parts: Any) -> str:
+    payload = json.dumps([kind, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _piece(kind: str, parts: tuple, build: Callable[[], Any]) -> Any:
+    key = artifact_fingerprint(kind, *parts)
+    value = _PIECES.get(key)
+    if value is None:
+        value = build()
+        _PIECES.set(key, value)
+    return value
+
+
+def incremental_stats() -> Dict[str, int]:
+    """Pieces reused from and rebuilt into the cache since start-up"""
+    return {"reused": _PIECES.hits, "rebuilt": _PIECES.misses, "cached": len(_PIECES)}
+
+
+def file_requirements(state: AgentState) -> List[str]:
+    answers = state.get('follow_up_answers', {})
+    goal = state.get('goal', '')
+    return _piece('file_requirements', (answers, goal), lambda: extract_file_requirements(answers, goal))
+
+
+def incremental_generated_code(state: AgentState) -> str:
+    """generate_production_code() with the cached file requirements"""
+    return generate_production_code(state, file_requirements(state))
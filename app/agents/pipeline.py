@@ -0,0 +1,140 @@
+"""
+Streamlit-free agent pipeline.
+
+    objective -> skill level -> subtasks -> follow-up questions -> refined objective -> code
+
+Each step takes an ``AgentState`` and returns the state keys it produced. Progress
+is reported through an optional ``progress(step, event, payload)`` callback instead
+of ``st.*``, so the same engine runs on the Streamlit script thread, in thread-pool
+workers or in batch processes. Events are:
+
+    ("subtasks" | "questions", "item", text)   an item finished streaming
+    ("refine", "text", text so far)             the refined objective is streaming
+    (step, "status", (level, message))          an agent status message
+    (step, "done", updates)                     the step finished
+
+app/agents/graph.py schedules these steps as a dependency graph and provides
+``run_pipeline``.
+"""
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from app.agents.state import AgentState
+from app.agents.user_skill_level import determine_user_skill_level
+from app.agents.subtasks import classify_into_subtasks
+from app.agents.followup_questions import (
+    generate_followup_questions_with_files,
+    process_followup_answers_with_files
+)
+from app.agents.incremental import incremental_generated_code
+from app.agents.explain_code import explain_code
+from app.rag.analyse_files import analyze_file_requirements
+from app.utils.constants import submit_llm_task
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[str, str, Any], None]
+
+DEFAULT_SKILL = {"skill_level": "intermediate", "reason": "Unable to determine - defaulting to intermediate"}
+
+
+def _emit(progress: Optional[ProgressCallback], step: str, event: str, payload: Any = None):
+    if progress:
+        progress(step, event, payload)
+
+
+def _notifier(progress: Optional[ProgressCallback], step: str) -> Callable[[str, str], None]:
+    """Adapt the agents' notify(level, message) hook to progress events"""
+    def notify(level: str, message: str):
+        _emit(progress, step, "status", (level, message))
+    return notify
+
+
+def detect_skill(state: AgentState, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Classify the user's skill level from the objective"""
+    try:
+        analysis = determine_user_skill_level(state.get('goal', ''))
+        updates = {'user_skill_level': analysis.get('skill_level', DEFAULT_SKILL['skill_level']),
+                   'skill_reason': analysis.get('reason', DEFAULT_SKILL['reason'])}
+    except Exception as e:
+        logger.error(f"Error detecting skill level: {e}")
+        updates = {'user_skill_level': DEFAULT_SKILL['skill_level'], 'skill_reason': DEFAULT_SKILL['reason']}
+    _emit(progress, "skill", "done", updates)
+    return updates
+
+
+def generate_subtasks(state: AgentState, progress: Optional[ProgressCallback] = None,
+                      context_files: Optional[list] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """Break the objective into subtasks, streaming each one to ``progress`` as it lands.
+
+    ``context_files`` are file-like uploads (``.name``/``.read()``) to ground the subtasks in.
+    """
+    on_item = (lambda item: _emit(progress, "subtasks", "item", item)) if progress else None
+    subtasks = classify_into_subtasks(state.get('goal', ''), use_cache=use_cache, on_item=on_item,
+                                      uploaded_files=context_files or [],
+                                      notify=_notifier(progress, "subtasks"))
+    updates = {'subtasks': subtasks}
+    _emit(progress, "subtasks", "done", updates)
+    return updates
+
+
+def generate_questions(state: AgentState, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Five follow-up questions for the objective at the detected skill level"""
+    on_question = (lambda question: _emit(progress, "questions", "item", question)) if progress else None
+    questions = generate_followup_questions_with_files(
+        state.get('goal', ''), state.get('user_skill_level') or 'intermediate',
+        state.get('uploaded_files') or [], on_question=on_question
+    )
+    updates = {'followup_questions': questions}
+    _emit(progress, "questions", "done", updates)
+    return updates
+
+
+def refine_objective(state: AgentState, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Fold the follow-up answers and uploaded files into a refined objective"""
+    on_text = (lambda text: _emit(progress, "refine", "text", text)) if progress else None
+    all_files = (state.get('uploaded_files') or []) + (state.get('question_specific_files') or [])
+    refined = process_followup_answers_with_files(
+        state.get('goal', ''), state.get('followup_questions') or [],
+        state.get('followup_answers') or {}, state.get('user_skill_level') or 'intermediate',
+        all_files, on_text=on_text
+    )
+    updates = {'refined_goal': refined}
+    _emit(progress, "refine", "done", updates)
+    return updates
+
+
+def build_file_analysis(state: AgentState) -> List[str]:
+    return analyze_file_requirements(state.get('followup_answers', {}))
+
+
+def build_generated_code(state: AgentState) -> str:
+    enhanced_data = dict(state)
+    # The code generator reads the answers under AgentState's older key
+    enhanced_data['follow_up_answers'] = state.get('followup_answers') or {}
+    if state.get('uploaded_files'):
+        enhanced_data['file_integration_required'] = True
+        enhanced_data['database_required'] = True
+        enhanced_data['file_types'] = [f['file_type'] for f in state['uploaded_files']]
+    return incremental_generated_code(enhanced_data)
+
+
+def build_code_explanation(state: AgentState) -> Dict[str, str]:
+    return explain_code(state)
+
+
+# Code artifacts depend only on the earlier steps' output, so they can all run at once
+CODE_ARTIFACTS: Dict[str, Callable[[AgentState], Any]] = {
+    'file_analysis': build_file_analysis,
+    'generated_code': build_generated_code,
+    'code_explanation': build_code_explanation,
+}
+
+
+def submit_code_artifacts(state: AgentState, names: Optional[List[str]] = None) -> Dict[str, Future]:
+    """Start code artifacts (all, or just ``names``) on the LLM thread pool against a snapshot of ``state``"""
+    snapshot = dict(state)
+    return {name: submit_llm_task(build, snapshot) for name, build in CODE_ARTIFACTS.items()
+            if names is None or name in names}
+
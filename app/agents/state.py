@@ -1,8 +1,8 @@
-from typing import TypedDict, Optional, List, Dict
+from typing import TypedDict, Optional, List, Dict, Any
 
 
 # Simplified State definition
-class AgentState(TypedDict):
+class AgentState(TypedDict, total=False):
     agent_name: Optional[str]
     domain: Optional[str]
     goal: Optional[str]
@@ -16,4 +16,17 @@ class AgentState(TypedDict):
     final_code: Optional[str]
     explanation: Optional[str]
     user_skill_level: Optional[str]  # Added to track user skill level
+    # Pipeline fields (same keys the Streamlit app keeps in st.session_state.data)
+    session_id: Optional[str]
+    skill_reason: Optional[str]
+    followup_questions: Optional[List[str]]
+    followup_answers: Optional[Dict[int, str]]
+    refined_goal: Optional[str]
+    integration_plan: Optional[str]
+    uploaded_files: Optional[List[Dict[str, Any]]]
+    question_specific_files: Optional[List[Dict[str, Any]]]
+    database_configs: Optional[List[Dict[str, Any]]]
+    file_analysis: Optional[List[str]]
+    generated_code: Optional[str]
+    code_explanation: Optional[Dict[str, str]]
  
\ No newline at end of file
@@ -1,9 +1,14 @@
 
 import streamlit as st
 import re
-from app.utils.constants import llm_invoke
-
-def process_complex_subtask_modification(current_tasks: list, user_request: str) -> list:
+from typing import Callable, Optional
+from app.utils.constants import llm_invoke, llm_stream, iter_numbered_items
+from app.utils.token_budget import fit_sections, SUBTASK_FILE_BUDGET
+from app.rag.analyse_files import extract_file_sections
+from app.ui.background import streamlit_notify
+
+def process_complex_subtask_modification(current_tasks: list, user_request: str,
+                                         notify: Callable[[str, str], None] = streamlit_notify) -> list:
     """Enhanced conversational subtask modification"""
     
     # Enhanced conversational prompt for LLM
@@ -48,25 +53,25 @@ Return only the updated numbered subtask list:"""
         if updated_tasks and len(updated_tasks) > 0:
             if "remove" in user_request.lower():
                 if len(updated_tasks) < len(current_tasks):
-                    st.success(f"✅ Removed tasks: {len(current_tasks)} → {len(updated_tasks)} tasks")
+                    notify("success", f"✅ Removed tasks: {len(current_tasks)} → {len(updated_tasks)} tasks")
                     return updated_tasks
                 else:
-                    st.warning("Remove operation didn't reduce task count")
+                    notify("warning", "Remove operation didn't reduce task count")
                     return current_tasks
             else:
                 # For other operations, allow same or different count
                 if updated_tasks != current_tasks:
-                    st.success(f"✅ Updated subtasks based on your request!")
+                    notify("success", f"✅ Updated subtasks based on your request!")
                     return updated_tasks
                 else:
-                    st.warning("No changes detected in the updated list")
+                    notify("warning", "No changes detected in the updated list")
                     return current_tasks
         else:
-            st.error("Could not parse updated tasks from LLM response")
+            notify("error", "Could not parse updated tasks from LLM response")
             return current_tasks
             
     except Exception as e:
-        st.error(f"Error processing request: {str(e)}")
+        notify("error", f"Error processing request: {str(e)}")
         return current_tasks
     #         st.success(f"✅ Updated subtasks based on your request!")
     #         return updated_tasks
@@ -146,16 +151,25 @@ def render_subtasks_for_review(subtasks: list, goal: str, key_prefix="subtask_re
         
     return None            
 
-def classify_into_subtasks(objective: str) -> list:
-    """Generate initial subtasks based on user objective"""
+def classify_into_subtasks(objective: str, use_cache: bool = True,
+                           on_item: Optional[Callable[[str], None]] = None,
+                           uploaded_files: Optional[list] = None,
+                           notify: Callable[[str, str], None] = streamlit_notify) -> list:
+    """Generate initial subtasks based on user objective.
+
+    When ``on_item`` is given the response is streamed and each subtask is
+    passed to it as soon as its numbered line is complete. Off the script
+    thread, pass ``uploaded_files`` explicitly and a thread-safe ``notify``.
+    """
     
-    uploaded_files = st.session_state.get('uploaded_files', [])
+    if uploaded_files is None:
+        uploaded_files = st.session_state.get('uploaded_files', [])
     file_context = ""
     
     if uploaded_files:
-        file_info = []
-        for file_data in uploaded_files:
-            file_info.append(f"- {file_data.name}: {file_data.read().decode()[:300]}...")
+        # Reads without moving the upload's cursor; PDFs are extracted, other binaries skipped
+        sections = extract_file_sections(uploaded_files)
+        file_info = [f"- {name}: {content}" for name, content in fit_sections(sections, SUBTASK_FILE_BUDGET)]
         file_context = f"\n\nUPLOADED FILES CONTEXT:\n" + "\n".join(file_info)
 
     prompt = f"""You are an expert project manager. Break down this objective into exactly 4-5 specific, actionable subtasks.
@@ -176,17 +190,33 @@ SUBTASKS FOR THIS OBJECTIVE:"""
     try:
         # 🔍 DEBUG: Print the prompt being sent
         # st.write("**DEBUG - Prompt sent to LLM:**")
-        st.text(prompt[:500] + "..." if len(prompt) > 500 else prompt)
+        notify("text", prompt[:500] + "..." if len(prompt) > 500 else prompt)
         
-        response = llm_invoke(prompt, max_tokens=800, temperature=0.2)  # Increased tokens
+        if on_item:
+            chunks = []
+
+            def _collect(stream):
+                for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+
+            stream = llm_stream(prompt, max_tokens=800, temperature=0.2, use_cache=use_cache)
+            streamed = 0
+            for item in iter_numbered_items(_collect(stream)):
+                if len(item) > 10 and streamed < 5:
+                    on_item(item)
+                    streamed += 1
+            response = "".join(chunks).strip()
+        else:
+            response = llm_invoke(prompt, max_tokens=800, temperature=0.2, use_cache=use_cache)  # Increased tokens
         
         # 🔍 DEBUG: Print raw LLM response  
         # st.write("**DEBUG - Raw LLM Response:**")
-        st.text(f"Response length: {len(response) if response else 0}")
-        st.text(response if response else "EMPTY RESPONSE!")
+        notify("text", f"Response length: {len(response) if response else 0}")
+        notify("text", response if response else "EMPTY RESPONSE!")
         
         if not response or len(response.strip()) < 10:
-            st.error("❌ LLM returned empty or very short response!")
+            notify("error", "❌ LLM returned empty or very short response!")
             return _get_domain_specific_fallback(objective)
 
         # Parse numbered list
@@ -199,14 +229,14 @@ SUBTASKS FOR THIS OBJECTIVE:"""
                     tasks.append(task)
 
         if len(tasks) >= 3:
-            st.success(f"✅ Generated {len(tasks)} custom subtasks")
+            notify("success", f"✅ Generated {len(tasks)} custom subtasks")
             return tasks[:5]
         else:
-            st.warning("⚠️ LLM generated too few tasks, using fallback")
+            notify("warning", "⚠️ LLM generated too few tasks, using fallback")
             return _get_domain_specific_fallback(objective)
             
     except Exception as e:
-        st.error(f"❌ Error generating subtasks: {e}")
+        notify("error", f"❌ Error generating subtasks: {e}")
         return _get_domain_specific_fallback(objective)
 
 # def classify_into_subtasks(objective: str) -> list:
@@ -52,11 +52,42 @@
 #     return files
 import json
 import os
+import hashlib
 from typing import Dict, List, Union
-import PyPDF2
 import io
 import streamlit as st
 from app.utils.constants import llm_invoke
+from app.utils.lru_cache import BoundedLRUCache
+from app.utils.token_budget import fit_sections, FILE_ANALYSIS_BUDGET
+
+# Process-wide caches keyed by file content, shared by every session
+FILE_TEXT_CACHE_MAX_ENTRIES = int(os.getenv("FILE_TEXT_CACHE_MAX_ENTRIES", "128"))
+FILE_TEXT_CACHE_MAX_CHARS = int(os.getenv("FILE_TEXT_CACHE_MAX_CHARS", str(20 * 1024 * 1024)))
+FILE_ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("FILE_ANALYSIS_CACHE_MAX_ENTRIES", "256"))
+
+
+# sha256(name, bytes) -> formatted text of one file
+_FILE_TEXT_CACHE = BoundedLRUCache(FILE_TEXT_CACHE_MAX_ENTRIES, FILE_TEXT_CACHE_MAX_CHARS, sizeof=len)
+# sha256(file hashes, answers) -> LLM summary lines
+_FILE_ANALYSIS_CACHE = BoundedLRUCache(FILE_ANALYSIS_CACHE_MAX_ENTRIES)
+
+
+def read_file_bytes(file) -> bytes:
+    """Raw bytes of a Streamlit UploadedFile, file-like object or path, without moving its cursor"""
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    if hasattr(file, 'read'):
+        position = file.tell() if hasattr(file, 'tell') else None
+        data = file.read()
+        if position is not None:
+            file.seek(position)
+        return data
+    with open(file, 'rb') as f:
+        return f.read()
+
+
+def file_content_hash(file_name: str, data: bytes) -> str:
+    return hashlib.sha256(file_name.encode('utf-8') + b'\0' + data).hexdigest()
 
 def extract_pdf_text(uploaded_file) -> str:
     """Extract text content from PDF file"""
@@ -71,6 +102,7 @@ def extract_pdf_text(uploaded_file) -> str:
             with open(uploaded_file, 'rb') as file:
                 pdf_file = io.BytesIO(file.read())
         
+        import PyPDF2  # deferred: only needed when a PDF is uploaded
         pdf_reader = PyPDF2.PdfReader(pdf_file)
         text = ""
         
@@ -82,55 +114,92 @@ def extract_pdf_text(uploaded_file) -> str:
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
 
-def extract_file_data(uploaded_files) -> str:
-    """Extract and return actual data from uploaded files"""
+def _extract_file_text(file_name: str, data: bytes) -> str:
+    """Formatted content of one file from its raw bytes"""
+    file_data = ""
+    
+    try:
+        if file_name.lower().endswith('.pdf'):
+            content = extract_pdf_text(io.BytesIO(data))
+            file_data += f"Content:\n{content}\n"
+        
+        elif file_name.lower().endswith(('.csv', '.txt')):
+            content = data.decode('utf-8')
+            file_data += f"Content:\n{content}\n"
+        
+        elif file_name.lower().endswith(('.json')):
+            content = data.decode('utf-8')
+            try:
+                json_data = json.loads(content)
+                file_data += f"JSON Data:\n{json.dumps(json_data, indent=2)}\n"
+            except:
+                file_data += f"Raw Content:\n{content}\n"
+        
+        else:
+            file_data += "File type not supported for text extraction\n"
+            
+    except Exception as e:
+        file_data += f"Error reading file: {str(e)}\n"
+    
+    return file_data
+
+def _hashed_file_sections(uploaded_files) -> List[tuple]:
+    """(file name, content hash, formatted content) per file, extracting each distinct file once"""
     extracted_data = []
     
     for file in uploaded_files:
         file_name = getattr(file, 'name', str(file))
-        file_data = f"\n**File: {file_name}**\n"
-        
         try:
-            if file_name.lower().endswith('.pdf'):
-                content = extract_pdf_text(file)
-                file_data += f"Content:\n{content}\n"
-            
-            elif file_name.lower().endswith(('.csv', '.txt')):
-                if hasattr(file, 'read'):
-                    content = file.read().decode('utf-8')
-                else:
-                    with open(file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                file_data += f"Content:\n{content}\n"
-            
-            elif file_name.lower().endswith(('.json')):
-                if hasattr(file, 'read'):
-                    content = file.read().decode('utf-8')
-                else:
-                    with open(file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                try:
-                    json_data = json.loads(content)
-                    file_data += f"JSON Data:\n{json.dumps(json_data, indent=2)}\n"
-                except:
-                    file_data += f"Raw Content:\n{content}\n"
-            
-            else:
-                file_data += "File type not supported for text extraction\n"
-                
+            data = read_file_bytes(file)
         except Exception as e:
-            file_data += f"Error reading file: {str(e)}\n"
+            extracted_data.append((file_name, None, f"Error reading file: {str(e)}\n"))
+            continue
         
-        extracted_data.append(file_data)
+        content_hash = file_content_hash(file_name, data)
+        file_data = _FILE_TEXT_CACHE.get(content_hash)
+        if file_data is None:
+            file_data = _extract_file_text(file_name, data)
+            _FILE_TEXT_CACHE.set(content_hash, file_data)
+        extracted_data.append((file_name, content_hash, file_data))
     
-    return "\n".join(extracted_data)
+    return extracted_data
+
+def extract_file_sections(uploaded_files) -> List[tuple]:
+    """Extract (file name, formatted content) for each uploaded file"""
+    return [(file_name, file_data) for file_name, _, file_data in _hashed_file_sections(uploaded_files)]
+
+def format_file_sections(sections: List[tuple]) -> str:
+    return "\n".join(f"\n**File: {file_name}**\n{file_data}" for file_name, file_data in sections)
+
+def extract_file_data(uploaded_files) -> str:
+    """Extract and return actual data from uploaded files"""
+    return format_file_sections(extract_file_sections(uploaded_files))
 
 def analyze_file_requirements(answers: Dict[str, str], uploaded_files=None) -> List[str]:
-    """Read files and write out the actual data from each given file"""
+    """Read files and write out the actual data from each given file.
+
+    Results are cached process-wide by the SHA-256 of the file contents plus the
+    answers, so re-rendering the same uploads does not re-read files or call the LLM.
+    """
+    
+    sections = _hashed_file_sections(uploaded_files) if uploaded_files else []
+    if any(content_hash is None for _, content_hash, _ in sections):
+        cache_key = None
+    else:
+        cache_key = hashlib.sha256(json.dumps(
+            [[content_hash for _, content_hash, _ in sections], answers],
+            sort_keys=True, default=str
+        ).encode('utf-8')).hexdigest()
+        cached = _FILE_ANALYSIS_CACHE.get(cache_key)
+        if cached is not None:
+            return list(cached)
     
     if uploaded_files:
-        # Extract actual file content
-        file_content = extract_file_data(uploaded_files)
+        # Extract actual file content, compressed to fit the prompt budget
+        file_content = format_file_sections(
+            fit_sections([(file_name, file_data) for file_name, _, file_data in sections],
+                         FILE_ANALYSIS_BUDGET)
+        )
         
         prompt = f"""Read these files and write out some of the data from each given file. Do NOT provide any suggestions or advice.
 
@@ -159,4 +228,6 @@ Return ONLY a simple list of required files (one per line):
         if line and not line.startswith('Requirements:') and not line.startswith('User Requirements:'):
             files.append(line)
     
+    if cache_key is not None:
+        _FILE_ANALYSIS_CACHE.set(cache_key, tuple(files))
     return files
@@ -0,0 +1,54 @@
+import queue
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict
+import streamlit as st
+
+
+def streamlit_notify(level: str, message: str):
+    """Show an agent status message with the Streamlit element of the same name (text, success, ...)"""
+    getattr(st, level)(message)
+
+
+class ScriptThreadRelay:
+    """Carry progress from worker threads back to the Streamlit script thread.
+
+    Worker threads must not call ``st.*`` themselves; they post events through
+    callbacks from :meth:`callback`, and the script thread replays them with
+    :meth:`pump` while it waits for the futures to finish.
+    """
+
+    def __init__(self):
+        self._events = queue.Queue()
+
+    def callback(self, kind: str) -> Callable[..., None]:
+        """A thread-safe callback that posts its arguments as a ``kind`` event"""
+        def post(*args):
+            self._events.put((kind, args))
+        return post
+
+    def _dispatch(self, handlers: Dict[str, Callable[..., None]]):
+        while True:
+            try:
+                kind, args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            handler = handlers.get(kind)
+            if handler:
+                handler(*args)
+
+    def pump(self, futures: Dict[str, Future], handlers: Dict[str, Callable[..., None]],
+             on_done: Callable[[str, Future], None], poll_interval: float = 0.05):
+        """Replay events until every future is done, calling ``on_done`` as each one lands"""
+        pending = dict(futures)
+        while pending:
+            self._dispatch(handlers)
+            for name, future in list(pending.items()):
+                if future.done():
+                    # Flush events the worker posted before it finished
+                    self._dispatch(handlers)
+                    on_done(name, future)
+                    del pending[name]
+            if pending:
+                wait(list(pending.values()), timeout=poll_interval, return_when=FIRST_COMPLETED)
+        self._dispatch(handlers)
+
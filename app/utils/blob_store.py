@@ -0,0 +1,184 @@
+"""
+Content-addressed store for uploaded file bytes.
+
+Blobs are keyed by the SHA-256 of their bytes, so the same file uploaded in
+several sessions or questions is stored once. Each row keeps the full bytes and
+the text extracted from them, both compressed (zlib by default, lzma with
+BLOB_COMPRESSION=lzma). Data that does not shrink, such as images, PDFs and
+office files, is kept raw. Tables that refer to a file store only its hash.
+"""
+import hashlib
+import logging
+import lzma
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.utils.maintenance import PURGE_BATCH_SIZE, batch_pause, register_purge
+from app.utils.storage import enqueue_write, flush_writes, get_connection, register_schema, transaction
+
+logger = logging.getLogger(__name__)
+
+BLOB_DB = os.getenv("BLOB_STORE_DB", "file_blobs.db")
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "zlib").lower()
+BLOB_ZLIB_LEVEL = int(os.getenv("BLOB_ZLIB_LEVEL", "6"))
+BLOB_LZMA_PRESET = int(os.getenv("BLOB_LZMA_PRESET", "6"))
+# Unreferenced blobs are kept this long after their last use (e.g. uploads of an unsubmitted form)
+BLOB_UNREFERENCED_GRACE_DAYS = float(os.getenv("BLOB_UNREFERENCED_GRACE_DAYS", "7"))
+
+# (db_path, table, column, json_key) holding blob references, registered by the tables' owners
+_REFERENCES: List[Tuple[str, str, str, Optional[str]]] = []
+
+
+def _create_blob_tables(conn: sqlite3.Connection):
+    """Create the blob table; run once per process by the storage layer"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_blobs (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER,
+            codec TEXT,
+            data BLOB,
+            text_codec TEXT,
+            text BLOB,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_file_blobs_last_used_at ON file_blobs (last_used_at)')
+
+register_schema(BLOB_DB, _create_blob_tables)
+
+
+def blob_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """(codec, payload) for ``data``; 'raw' when compressing would not save space"""
+    if BLOB_COMPRESSION == "lzma":
+        codec, packed = "lzma", lzma.compress(data, preset=BLOB_LZMA_PRESET)
+    elif BLOB_COMPRESSION == "zlib":
+        codec, packed = "zlib", zlib.compress(data, BLOB_ZLIB_LEVEL)
+    else:
+        return "raw", data
+    return (codec, packed) if len(packed) < len(data) else ("raw", data)
+
+
+def decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "lzma":
+        return lzma.decompress(payload)
+    return payload
+
+
+def put_blob(data: bytes, text: Optional[str] = None) -> str:
+    """Store ``data`` (and its extracted ``text``) once; returns the SHA-256 reference.
+
+    Written through the write-behind queue as an upsert, so a blob that is already
+    stored only has its last use refreshed, and one whose earlier write was lost or
+    purged is written again. get_blob/get_blob_text see it once committed.
+    """
+    sha256 = blob_hash(data)
+    codec, payload = compress(data)
+    text_codec, text_payload = compress(text.encode("utf-8")) if text is not None else (None, None)
+    enqueue_write(BLOB_DB, '''
+        INSERT INTO file_blobs (sha256, size, codec, data, text_codec, text)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(sha256) DO UPDATE SET
+            text_codec = COALESCE(file_blobs.text_codec, excluded.text_codec),
+            text = COALESCE(file_blobs.text, excluded.text),
+            last_used_at = CURRENT_TIMESTAMP
+    ''', (sha256, len(data), codec, payload, text_codec, text_payload))
+    return sha256
+
+
+def _fetch(sha256: str, columns: str, wait: bool = False) -> Optional[tuple]:
+    if wait:
+        flush_writes()
+    return get_connection(BLOB_DB).execute(
+        f"SELECT {columns} FROM file_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+
+
+def get_blob(sha256: str, wait: bool = False) -> Optional[bytes]:
+    """Full bytes of a stored file, or None if unknown.
+
+    Reads committed rows only; ``wait=True`` first flushes queued writes, which blocks,
+    so keep it to maintenance and test code.
+    """
+    row = _fetch(sha256, "codec, data", wait)
+    return decompress(row[0], row[1]) if row else None
+
+
+def get_blob_text(sha256: str, wait: bool = False) -> Optional[str]:
+    """Text extracted from a stored file, or None if unknown, never extracted or not yet committed"""
+    row = _fetch(sha256, "text_codec, text", wait)
+    if not row or row[1] is None:
+        return None
+    return decompress(row[0], row[1]).decode("utf-8")
+
+
+def blob_stats() -> Dict[str, int]:
+    """Number of blobs, their original size and the bytes actually stored"""
+    flush_writes()
+    count, size, stored = get_connection(BLOB_DB).execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+        "COALESCE(SUM(LENGTH(data) + COALESCE(LENGTH(text), 0)), 0) FROM file_blobs").fetchone()
+    return {"blobs": count, "original_bytes": size, "stored_bytes": stored}
+
+
+def register_blob_references(db_path: str, table: str, column: str, json_key: Optional[str] = None):
+    """Declare a column of SHA-256 references; blobs it names are never purged.
+
+    With ``json_key`` the column holds JSON documents, and every ``json_key``
+    member at any depth in them is a reference.
+    """
+    if (db_path, table, column, json_key) not in _REFERENCES:
+        _REFERENCES.append((db_path, table, column, json_key))
+
+
+def _referenced_blobs() -> Set[str]:
+    referenced: Set[str] = set()
+    for db_path, table, column, json_key in _REFERENCES:
+        if not os.path.exists(db_path):
+            continue  # a database the app has not created yet refers to nothing
+        if json_key:
+            rows = get_connection(db_path).execute(
+                f"SELECT DISTINCT j.value FROM {table}, json_tree({table}.{column}) j "
+                f"WHERE json_valid({table}.{column}) AND j.key = ? AND j.type = 'text'", (json_key,))
+        else:
+            rows = get_connection(db_path).execute(
+                f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL")
+        referenced.update(row[0] for row in rows)
+    return referenced
+
+
+def purge_unreferenced_blobs(grace_days: float = BLOB_UNREFERENCED_GRACE_DAYS,
+                             batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Delete blobs no registered table refers to and unused for ``grace_days``; returns the count"""
+    if grace_days <= 0:
+        return 0
+    flush_writes()
+    referenced = _referenced_blobs()
+    cutoff = (datetime.utcnow() - timedelta(days=grace_days)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = get_connection(BLOB_DB)
+    deleted = 0
+    last = ""
+    while True:
+        candidates = [row[0] for row in conn.execute(
+            "SELECT sha256 FROM file_blobs WHERE sha256 > ? AND last_used_at < ? ORDER BY sha256 LIMIT ?",
+            (last, cutoff, batch_size))]
+        if not candidates:
+            break
+        last = candidates[-1]
+        unreferenced = [(sha256, cutoff) for sha256 in candidates if sha256 not in referenced]
+        if unreferenced:
+            with transaction(BLOB_DB) as write_conn:
+                deleted += write_conn.executemany(
+                    "DELETE FROM file_blobs WHERE sha256 = ? AND last_used_at < ?", unreferenced).rowcount
+            batch_pause()
+    return deleted
+
+register_purge("file_blobs", purge_unreferenced_blobs)
@@ -1,25 +1,299 @@
-import streamlit as st
-from typing import TypedDict, Optional, List, Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import TypedDict, Optional, List, Dict, Any, Iterator, Iterable, TYPE_CHECKING
 import os
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
+from app.utils.llm_cache import get_llm_cache, make_cache_key
+from app.utils.rate_limiter import RateLimiter, estimate_request_tokens
+from app.utils.stub_llm_server import load_config, start_stub_server
+from app.utils.llm_metrics import (
+    detect_call_site, estimate_tokens, extract_token_usage, record_llm_call, summarize_llm_calls
+)
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# ✅ SINGLE CLIENT - OpenAI Only
-CLIENT = ChatOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    # base_url="http://10.10.9.79:8000/v1",
-    # model_name="DeepSeek-R1-Distill-Llama-8B",  # or "gpt-3.5-turbo" for cheaper/faster
-    temperature=0.7,
-    max_tokens=2048  # Set default max_tokens
-)
+LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+LLM_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Offline mode: LLM_STUB_SERVER=1 (or a JSON config path) serves every call from a local stub,
+# bypassing the persistent response cache
+LLM_STUB_SERVER = os.getenv("LLM_STUB_SERVER")
+_STUB_SERVER = None
+
+DEFAULT_MAX_TOKENS = 2048
+DEFAULT_TEMPERATURE = 0.7
+
+# Heavy client libraries (httpx, langchain_openai) load on the first LLM call, not at import
+_HTTP_CLIENT: Optional["httpx.Client"] = None
+_CLIENT_POOL: Dict[tuple, "ChatOpenAI"] = {}
+_CLIENT_POOL_LOCK = threading.Lock()
+
+def _get_http_client() -> "httpx.Client":
+    """Keep-alive HTTP connections shared by every pooled client (call with the pool lock held)"""
+    global _HTTP_CLIENT, _STUB_SERVER, LLM_BASE_URL, LLM_API_KEY
+    if _HTTP_CLIENT is None:
+        import httpx
+
+        if LLM_STUB_SERVER and _STUB_SERVER is None:
+            stub_config = load_config(LLM_STUB_SERVER) if LLM_STUB_SERVER.endswith(".json") else {}
+            _STUB_SERVER, LLM_BASE_URL = start_stub_server(stub_config)
+            LLM_API_KEY = LLM_API_KEY or "stub"
+
+        _HTTP_CLIENT = httpx.Client(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120),
+            timeout=httpx.Timeout(120.0, connect=10.0)
+        )
+    return _HTTP_CLIENT
+
+def get_client(max_tokens: int = DEFAULT_MAX_TOKENS, temperature: float = DEFAULT_TEMPERATURE,
+               stop: Optional[List[str]] = None, model: str = LLM_MODEL) -> "ChatOpenAI":
+    """Return the pooled client for (model, max_tokens, temperature, stop), creating it once"""
+    key = (model, max_tokens, temperature, tuple(stop) if stop else None)
+    client = _CLIENT_POOL.get(key)
+    if client is None:
+        with _CLIENT_POOL_LOCK:
+            client = _CLIENT_POOL.get(key)
+            if client is None:
+                from langchain_openai import ChatOpenAI
+
+                http_client = _get_http_client()
+                options = {"stop": list(stop)} if stop else {}
+                client = ChatOpenAI(
+                    api_key=LLM_API_KEY,
+                    model=model,
+                    base_url=LLM_BASE_URL,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    http_client=http_client,
+                    max_retries=0,  # retries and backoff are owned by _LLM_LIMITER
+                    **options
+                )
+                _CLIENT_POOL[key] = client
+    return client
+
+def __getattr__(name: str):
+    # ✅ SINGLE CLIENT - OpenAI Only; built on first access (per-call clients come from get_client)
+    if name == "CLIENT":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_prewarmed = False
+
+def prewarm_clients(presets: Optional[List[Dict[str, Any]]] = None):
+    """In the background, build pooled clients for the given presets and open a keep-alive connection"""
+    global _prewarmed
+    if _prewarmed or os.getenv("LLM_PREWARM", "1") == "0":
+        return
+    _prewarmed = True
+
+    def _prewarm():
+        import httpx
+
+        # Importing langchain_openai and building clients happens here, off the script thread
+        for preset in presets or []:
+            get_client(**preset)
+        with _CLIENT_POOL_LOCK:
+            http_client = _get_http_client()
+        base_url = (LLM_BASE_URL or "https://api.openai.com/v1").rstrip("/")
+        try:
+            http_client.get(f"{base_url}/models",
+                            headers={"Authorization": f"Bearer {LLM_API_KEY or ''}"})
+        except httpx.HTTPError as e:
+            logger.warning(f"LLM connection pre-warm failed: {e}")
+
+    threading.Thread(target=_prewarm, name="llm-prewarm", daemon=True).start()
+
+def _request_params(max_tokens: int, temperature: float, stop: Optional[List[str]]) -> Dict[str, Any]:
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    if stop:
+        params["stop"] = list(stop)
+    return params
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still in flight wait for and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
 
-def llm_invoke(prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> str:
-    """Single LLM invocation - OpenAI only"""
-    response = CLIENT.invoke(prompt)
-    return response.content.strip()
+# Provider limits (LLM_RPM / LLM_TPM / LLM_MAX_CONCURRENCY) shared by every upstream call
+_LLM_LIMITER = RateLimiter.from_env()
+
+def llm_rate_limit_metrics() -> Dict[str, Any]:
+    """Current rate limiter counters and adaptive concurrency"""
+    return _LLM_LIMITER.metrics()
+
+# Process-wide: identical prompts in flight from any session share one upstream request
+_LLM_SINGLE_FLIGHT = SingleFlight()
+
+def _cache_key(params: Dict[str, Any], prompt: str) -> str:
+    """Key of a request; includes the backend so one provider's answers are never served for another"""
+    return make_cache_key(LLM_MODEL, params, prompt, backend=LLM_BASE_URL or "https://api.openai.com/v1")
+
+def _response_cache():
+    """The persistent response cache, or None while the stub server answers (its output is fake)"""
+    return None if LLM_STUB_SERVER else get_llm_cache()
+
+def _cached_completion(prompt: str, params: Dict[str, Any], use_cache: bool) -> str:
+    """Return a completion, serving repeats of identical requests from the response cache"""
+    call_site = detect_call_site()
+    started = time.perf_counter()
+    key = _cache_key(params, prompt)
+    cache = _response_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            record_llm_call(call_site, LLM_MODEL, time.perf_counter() - started,
+                            estimate_tokens(prompt), estimate_tokens(cached), cache_hit=True)
+            return cached
+
+    usage = {}
+
+    def _upstream() -> str:
+        client = get_client(**params)
+        response = _LLM_LIMITER.call(lambda: client.invoke(prompt),
+                                     estimated_tokens=estimate_request_tokens(prompt, params["max_tokens"]))
+        content = response.content.strip()
+        usage.update(extract_token_usage(response))
+        usage["prompt_tokens"] = usage["prompt_tokens"] or estimate_tokens(prompt)
+        usage["completion_tokens"] = usage["completion_tokens"] or estimate_tokens(content)
+        if cache is not None and content:
+            cache.set(key, LLM_MODEL, content)
+        return content
+
+    try:
+        content = _LLM_SINGLE_FLIGHT.do(key, _upstream)
+    except Exception as e:
+        record_llm_call(call_site, LLM_MODEL, time.perf_counter() - started, error=repr(e))
+        raise
+
+    # Waiters coalesced onto another caller's request paid no tokens of their own
+    record_llm_call(call_site, LLM_MODEL, time.perf_counter() - started,
+                    usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                    coalesced=not usage)
+    return content
+
+def llm_call_summary() -> Dict[str, Dict[str, Any]]:
+    """Per-call-site latency percentiles, token counts, cache hits and errors"""
+    return summarize_llm_calls()
+
+def llm_invoke(prompt: str, max_tokens: int = 512, temperature: float = 0.7,
+               use_cache: bool = True, stop: Optional[List[str]] = None) -> str:
+    """Single LLM invocation - OpenAI only.
+
+    Pass ``use_cache=False`` when a fresh sample is wanted for a repeated prompt.
+    """
+    return _cached_completion(prompt, _request_params(max_tokens, temperature, stop), use_cache)
+
+def llm_stream(prompt: str, max_tokens: int = 512, temperature: float = 0.7,
+               use_cache: bool = True, stop: Optional[List[str]] = None) -> Iterator[str]:
+    """Streaming LLM invocation that yields text chunks as the model produces them.
+
+    A cache hit is yielded as a single chunk; a completed stream is written back
+    to the same cache llm_invoke uses.
+    """
+    params = _request_params(max_tokens, temperature, stop)
+    call_site = detect_call_site()
+    started = time.perf_counter()
+    cache = _response_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = _cache_key(params, prompt)
+        cached = cache.get(key)
+        if cached is not None:
+            record_llm_call(call_site, LLM_MODEL, time.perf_counter() - started,
+                            estimate_tokens(prompt), estimate_tokens(cached), cache_hit=True, streamed=True)
+            yield cached
+            return
+
+    chunks = []
+    try:
+        # Throttled or failed requests are retried until the first chunk arrives
+        for chunk in _LLM_LIMITER.stream(lambda: get_client(**params).stream(prompt),
+                                         estimate_request_tokens(prompt, max_tokens)):
+            text = chunk.content
+            if text:
+                chunks.append(text)
+                yield text
+    except Exception as e:
+        record_llm_call(call_site, LLM_MODEL, time.perf_counter() - started, streamed=True, error=repr(e))
+        raise
+
+    content = "".join(chunks).strip()
+    record_llm_call(call_site, LLM_MODEL, time.perf_counter() - started,
+                    estimate_tokens(prompt), estimate_tokens(content), streamed=True)
+    if cache is not None and content:
+        cache.set(key, LLM_MODEL, content)
+
+NUMBERED_LINE = re.compile(r'^\d+\.\s')
+
+def _numbered_item(line: str) -> Optional[str]:
+    line = line.strip()
+    if NUMBERED_LINE.match(line):
+        return re.sub(r'^\d+\.\s*', '', line).strip() or None
+    return None
+
+def iter_numbered_items(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield each "N. item" line of a streamed numbered list as soon as the line completes"""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            item = _numbered_item(line)
+            if item:
+                yield item
+    item = _numbered_item(buffer)
+    if item:
+        yield item
+
+# Bounded worker pool shared by all concurrent LLM calls in this process
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "8"))
+_LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm")
+
+def submit_llm_task(fn, *args, **kwargs):
+    """Run any LLM-backed function on the shared worker pool and return its future"""
+    return _LLM_EXECUTOR.submit(fn, *args, **kwargs)
 
 def human_assistant(question: str, context: str) -> str:
     """Provide helpful explanations to users"""
@@ -32,49 +306,16 @@ Provide a clear, concise answer (1-3 sentences) using simple language when possi
 """
     return llm_invoke(prompt)
 
-def llm_for_subtasks(prompt: str) -> str:
+def llm_for_subtasks(prompt: str, use_cache: bool = True) -> str:
     """Wrapper function for LLM calls specifically for subtask generation"""
     try:
-        response = CLIENT.invoke(prompt)
-        return response.content.strip()
+        return _cached_completion(prompt, _request_params(DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, None),
+                                  use_cache)
     except Exception as e:
-        return f"Error generating subtasks: {str(e)}"
+        # An error string here would be parsed as subtasks; let callers fall back instead
+        logger.error(f"Error generating subtasks: {e}")
+        return ""
 
-class LLMService:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY") 
-        
-    def invoke(self, prompt: str, max_tokens: int = 200) -> str:
-        """Invoke LLM with proper error handling"""
-        try:
-            # Replace this with your actual LLM client
-            # Example for OpenAI:
-            # from openai import OpenAI
-            # client = OpenAI(api_key=self.api_key)
-            # response = client.chat.completions.create(
-            #     model="gpt-3.5-turbo",
-            #     messages=[{"role": "user", "content": prompt}],
-            #     max_tokens=max_tokens,
-            #     temperature=0.2
-            # )
-            # return response.choices[0].message.content
-            
-            # For now, let's use a mock response that shows the structure works
-            if "modify" in prompt.lower() or "update" in prompt.lower():
-                return """1. Define requirements and data sources
-2. Design system architecture  
-3. Implement core functionality
-4. Add security validation
-5. Deploy and test system"""
-            else:
-                return "Mock LLM response for: " + prompt[:50] + "..."
-                
-        except Exception as e:
-            print(f"LLM Error: {e}")
-            return ""
-
-# Create global instance
-llm_service = LLMService()
 ##########################################################################
 ##################################################
 # import streamlit as st
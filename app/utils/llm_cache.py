@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+
+from app.utils.maintenance import PURGE_BATCH_SIZE, batch_pause, register_purge
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+# A hit rewrites last_accessed only when the stored value is older than this;
+# LRU eviction needs coarse recency, not a write per hit
+LLM_CACHE_TOUCH_INTERVAL_SECONDS = float(os.getenv("LLM_CACHE_TOUCH_INTERVAL_SECONDS", "300"))
+
+
+def make_cache_key(model: str, params: Dict[str, Any], prompt: str, backend: str = "") -> str:
+    """Content-address an LLM request by backend (base URL), model, sampling parameters and prompt"""
+    payload = json.dumps({"backend": backend, "model": model, "params": params, "prompt": prompt},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed LLM response cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, db_path: str = LLM_CACHE_DB, ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 touch_interval: float = LLM_CACHE_TOUCH_INTERVAL_SECONDS):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL with synchronous=NORMAL: commits on the script thread skip the fsync
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_accessed REAL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)')
+        self._conn.commit()
+        # Expired entries are otherwise only dropped when a new response is stored
+        register_purge('llm_cache', self.purge_expired)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created_at, last_accessed FROM llm_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at, last_accessed = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM llm_cache WHERE cache_key = ?', (key,))
+                self._conn.commit()
+                return None
+            if now - (last_accessed or 0) >= self.touch_interval:
+                self._conn.execute('UPDATE llm_cache SET last_accessed = ? WHERE cache_key = ?', (now, key))
+                self._conn.commit()
+            return response
+
+    def set(self, key: str, model: str, response: str):
+        """Store a response and evict least recently used entries over the size cap"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (cache_key, model, response, created_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, response, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl_seconds:
+            self._conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute('''
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_accessed ASC LIMIT ?
+                )
+            ''', (overflow,))
+
+    def purge_expired(self, batch_size: int = PURGE_BATCH_SIZE) -> int:
+        """Delete expired entries on the cache's own connection, releasing the lock between batches"""
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        deleted = 0
+        while True:
+            with self._lock:
+                count = self._conn.execute('''
+                    DELETE FROM llm_cache WHERE cache_key IN (
+                        SELECT cache_key FROM llm_cache WHERE created_at < ? LIMIT ?
+                    )
+                ''', (cutoff, batch_size)).rowcount
+                self._conn.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+            batch_pause()
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute('DELETE FROM llm_cache')
+            self._conn.commit()
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the process-wide response cache, or None when caching is disabled"""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = LLMResponseCache()
+                except sqlite3.Error as e:
+                    logger.error(f"LLM cache unavailable: {e}")
+                    return None
+    return _cache
@@ -0,0 +1,162 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+LLM_METRICS_BUFFER_SIZE = int(os.getenv("LLM_METRICS_BUFFER_SIZE", "2000"))
+LLM_METRICS_JSONL = os.getenv("LLM_METRICS_JSONL")
+LLM_METRICS_DB = os.getenv("LLM_METRICS_DB")
+
+# Frames from these modules are plumbing, not the agent that asked for the completion
+_PLUMBING_MODULES = ("app.utils.constants", "app.utils.llm_metrics", "app.utils.rate_limiter",
+                     "concurrent.futures", "threading", "asyncio", "contextlib")
+
+_records = deque(maxlen=LLM_METRICS_BUFFER_SIZE)
+_records_lock = threading.Lock()
+_sink_lock = threading.Lock()
+_sink_conn: Optional[sqlite3.Connection] = None
+
+
+def detect_call_site() -> str:
+    """Name of the first agent function outside the LLM plumbing on the current stack"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        name = frame.f_code.co_name
+        # Private helpers, lambdas and generator wrappers report their enclosing agent
+        if not module.startswith(_PLUMBING_MODULES) and not name.startswith(("_", "<")):
+            return name
+        frame = frame.f_back
+    return "unknown"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 if text else 0
+
+
+def extract_token_usage(response) -> Dict[str, int]:
+    """Prompt/completion token counts reported by a LangChain chat response, if any"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        return {"prompt_tokens": usage.get("input_tokens", 0),
+                "completion_tokens": usage.get("output_tokens", 0)}
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return {"prompt_tokens": token_usage.get("prompt_tokens", 0),
+            "completion_tokens": token_usage.get("completion_tokens", 0)}
+
+
+def _get_sink_conn() -> sqlite3.Connection:
+    global _sink_conn
+    if _sink_conn is None:
+        _sink_conn = sqlite3.connect(LLM_METRICS_DB, check_same_thread=False)
+        _sink_conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL,
+                call_site TEXT,
+                model TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                latency_ms REAL,
+                cache_hit INTEGER,
+                coalesced INTEGER,
+                streamed INTEGER,
+                error TEXT
+            )
+        ''')
+        _sink_conn.commit()
+    return _sink_conn
+
+
+def _write_sinks(record: Dict[str, Any]):
+    if not (LLM_METRICS_JSONL or LLM_METRICS_DB):
+        return
+    with _sink_lock:
+        try:
+            if LLM_METRICS_JSONL:
+                with open(LLM_METRICS_JSONL, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            if LLM_METRICS_DB:
+                conn = _get_sink_conn()
+                conn.execute('''
+                    INSERT INTO llm_calls
+                    (ts, call_site, model, prompt_tokens, completion_tokens, latency_ms,
+                     cache_hit, coalesced, streamed, error)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    record["ts"], record["call_site"], record["model"], record["prompt_tokens"],
+                    record["completion_tokens"], record["latency_ms"], int(record["cache_hit"]),
+                    int(record["coalesced"]), int(record["streamed"]), record["error"]
+                ))
+                conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error writing LLM metrics: {e}")
+
+
+def record_llm_call(call_site: str, model: str, latency_seconds: float, prompt_tokens: int = 0,
+                    completion_tokens: int = 0, cache_hit: bool = False, coalesced: bool = False,
+                    streamed: bool = False, error: Optional[str] = None):
+    """Append one LLM call to the ring buffer and the configured JSONL/SQLite sinks"""
+    record = {
+        "ts": time.time(),
+        "call_site": call_site,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency_ms": round(latency_seconds * 1000, 2),
+        "cache_hit": cache_hit,
+        "coalesced": coalesced,
+        "streamed": streamed,
+        "error": error,
+    }
+    with _records_lock:
+        _records.append(record)
+    _write_sinks(record)
+
+
+def get_llm_call_records() -> List[Dict[str, Any]]:
+    """Snapshot of the in-memory ring buffer, oldest first"""
+    with _records_lock:
+        return list(_records)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_llm_calls(records: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Per call site: counts, cache hit rate, paid tokens and p50/p95/p99 latency in ms"""
+    records = get_llm_call_records() if records is None else records
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        grouped.setdefault(record["call_site"], []).append(record)
+
+    summary = {}
+    for call_site, site_records in grouped.items():
+        latencies = sorted(r["latency_ms"] for r in site_records)
+        hits = sum(1 for r in site_records if r["cache_hit"])
+        paid = [r for r in site_records if not r["cache_hit"] and not r["coalesced"]]
+        summary[call_site] = {
+            "calls": len(site_records),
+            "errors": sum(1 for r in site_records if r["error"]),
+            "cache_hits": hits,
+            "cache_hit_rate": round(hits / len(site_records), 3),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in paid),
+            "completion_tokens": sum(r["completion_tokens"] for r in paid),
+            "total_latency_ms": round(sum(latencies), 2),
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+        }
+    return summary
@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class BoundedLRUCache:
+    """Thread-safe LRU mapping capped by entry count and, optionally, total size"""
+
+    def __init__(self, max_entries: int, max_size: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = lambda value: 1):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._size -= self._sizeof(self._data.pop(key))
+            if self.max_size is not None and size > self.max_size:
+                return
+            self._data[key] = value
+            self._size += size
+            while len(self._data) > self.max_entries or (
+                    self.max_size is not None and self._size > self.max_size):
+                _, evicted = self._data.popitem(last=False)
+                self._size -= self._sizeof(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,286 @@
+"""
+Retention, compaction and size reporting for the app's SQLite databases.
+
+The modules that own the tables declare what may expire:
+
+    register_retention(db_path, table, time_column)   rows older than N days
+    register_purge(name, purge)                       custom purges (e.g. unreferenced blobs)
+
+``run_maintenance()`` deletes expired rows a batch at a time. Each batch is its own
+short transaction with a pause after it, so the write-behind queue and the UI
+interleave with the purge instead of waiting behind one long DELETE. It then frees
+pages with incremental VACUUM, refreshes planner statistics with ANALYZE and
+reports size and fragmentation per database. ``start_maintenance_scheduler()``
+repeats that on a background thread.
+
+    python -m app.utils.maintenance --report
+    python -m app.utils.maintenance --run
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.utils.storage import _key, flush_writes, get_connection, locked, registered_databases, transaction
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "1") != "0"
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "6"))
+MAINTENANCE_INITIAL_DELAY_SECONDS = float(os.getenv("MAINTENANCE_INITIAL_DELAY_SECONDS", "300"))
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "90"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_BATCH_PAUSE_MS = int(os.getenv("PURGE_BATCH_PAUSE_MS", "50"))
+VACUUM_PAGES_PER_STEP = int(os.getenv("VACUUM_PAGES_PER_STEP", "1000"))
+# Converting a database to incremental auto-vacuum takes one full VACUUM, which blocks writers
+FULL_VACUUM_MAX_MB = float(os.getenv("FULL_VACUUM_MAX_MB", "256"))
+ANALYZE_ROW_LIMIT = int(os.getenv("ANALYZE_ROW_LIMIT", "1000"))
+
+
+class RetentionPolicy:
+    """Rows of ``table`` expire ``days`` after ``time_column``; ``epoch`` marks a REAL unix-time column"""
+
+    def __init__(self, db_path: str, table: str, time_column: str, key_column: str, days: float,
+                 epoch: bool = False):
+        self.db_path = db_path
+        self.table = table
+        self.time_column = time_column
+        self.key_column = key_column
+        self.days = days
+        self.epoch = epoch
+
+    def cutoff(self):
+        if self.epoch:
+            return time.time() - self.days * 86400
+        return (datetime.utcnow() - timedelta(days=self.days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+_policies: Dict[tuple, RetentionPolicy] = {}
+_purges: Dict[str, Callable[[], int]] = {}
+_registry_lock = threading.Lock()
+
+
+def register_retention(db_path: str, table: str, time_column: str, key_column: str = "id",
+                       days: Optional[float] = None, epoch: bool = False):
+    """Expire rows of ``table`` whose ``time_column`` is older than the retention period.
+
+    The period is RETENTION_DAYS_<TABLE> if set, else ``days``, else RETENTION_DAYS;
+    0 keeps the rows forever. ``time_column`` should be indexed.
+    """
+    default = RETENTION_DAYS if days is None else days
+    days = float(os.getenv(f"RETENTION_DAYS_{table.upper()}", str(default)))
+    with _registry_lock:
+        _policies[(_key(db_path), table)] = RetentionPolicy(db_path, table, time_column, key_column, days, epoch)
+
+
+def register_purge(name: str, purge: Callable[[], int]):
+    """Run ``purge()`` (returning the number of rows removed) after the retention deletes"""
+    with _registry_lock:
+        _purges[name] = purge
+
+
+def batch_pause():
+    time.sleep(PURGE_BATCH_PAUSE_MS / 1000)
+
+
+def delete_in_batches(db_path: str, table: str, key_column: str, where: str, params: Sequence[Any] = (),
+                      batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """DELETE the rows matching ``where`` at most ``batch_size`` per transaction; returns the count"""
+    sql = (f"DELETE FROM {table} WHERE {key_column} IN "
+           f"(SELECT {key_column} FROM {table} WHERE {where} LIMIT ?)")
+    deleted = 0
+    while True:
+        with transaction(db_path) as conn:
+            count = conn.execute(sql, (*params, batch_size)).rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+        batch_pause()
+
+
+def purge_expired() -> Dict[str, int]:
+    """Apply every retention policy and custom purge; rows removed per table/purge"""
+    flush_writes()
+    with _registry_lock:
+        policies = list(_policies.values())
+        purges = list(_purges.items())
+
+    removed: Dict[str, int] = {}
+    for policy in policies:
+        if policy.days <= 0 or not os.path.exists(policy.db_path):
+            continue
+        try:
+            removed[policy.table] = delete_in_batches(policy.db_path, policy.table, policy.key_column,
+                                                      f"{policy.time_column} < ?", (policy.cutoff(),))
+        except sqlite3.Error as e:
+            logger.error(f"Retention purge of {policy.table} failed: {e}")
+    for name, purge in purges:
+        try:
+            removed[name] = purge()
+        except Exception as e:
+            logger.error(f"Purge '{name}' failed: {e}")
+    return removed
+
+
+def managed_databases() -> List[str]:
+    with _registry_lock:
+        paths = {_key(policy.db_path) for policy in _policies.values()}
+    paths.update(registered_databases())
+    return sorted(path for path in paths if path != ":memory:" and os.path.exists(path))
+
+
+def compact(db_path: str) -> int:
+    """Return free pages to the filesystem and refresh statistics; returns pages freed.
+
+    Databases created before incremental auto-vacuum was enabled are converted with
+    one full VACUUM if they are under FULL_VACUUM_MAX_MB, and skipped otherwise.
+    """
+    with locked(db_path) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            size_mb = os.path.getsize(db_path) / (1024 * 1024) if os.path.exists(db_path) else 0
+            if size_mb > FULL_VACUUM_MAX_MB:
+                logger.warning(f"{db_path} is {size_mb:.0f} MB without incremental auto-vacuum; "
+                               f"run a full VACUUM off-hours to enable it")
+            else:
+                conn.commit()
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+        incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+    freed = 0
+    while incremental:
+        # One step per lock hold, so queued writes run during the pause
+        with locked(db_path) as conn:
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free_pages:
+                break
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})").fetchall()
+            conn.commit()
+            step = free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if step <= 0:
+            break
+        freed += step
+        batch_pause()
+
+    with locked(db_path) as conn:
+        conn.execute(f"PRAGMA analysis_limit={ANALYZE_ROW_LIMIT}")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return freed
+
+
+def database_report(db_path: str) -> Dict[str, Any]:
+    """File size, WAL size, page usage, fragmentation and row counts of one database"""
+    conn = get_connection(db_path)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal_path = db_path + "-wal"
+    with _registry_lock:
+        tables = [policy.table for policy in _policies.values() if _key(policy.db_path) == _key(db_path)]
+    return {
+        "database": db_path,
+        "file_bytes": os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "page_size": page_size,
+        "pages": page_count,
+        "free_pages": free_pages,
+        "fragmentation": round(free_pages / page_count, 4) if page_count else 0.0,
+        "incremental_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2,
+        "rows": {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables},
+    }
+
+
+def maintenance_report() -> List[Dict[str, Any]]:
+    reports = []
+    for db_path in managed_databases():
+        try:
+            reports.append(database_report(db_path))
+        except sqlite3.Error as e:
+            logger.error(f"Could not report on {db_path}: {e}")
+    return reports
+
+
+def run_maintenance() -> Dict[str, Any]:
+    """Purge expired rows, compact every database and report on them"""
+    started = time.perf_counter()
+    removed = purge_expired()
+    freed = {}
+    for db_path in managed_databases():
+        try:
+            freed[db_path] = compact(db_path)
+        except sqlite3.Error as e:
+            logger.error(f"Compaction of {db_path} failed: {e}")
+    result = {
+        "removed_rows": removed,
+        "freed_pages": freed,
+        "databases": maintenance_report(),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info(f"Maintenance removed {sum(removed.values())} rows and freed "
+                f"{sum(freed.values())} pages in {result['elapsed_seconds']}s")
+    return result
+
+
+_scheduler: Optional[threading.Thread] = None
+_scheduler_stop = threading.Event()
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_loop(interval_seconds: float, initial_delay: float):
+    if _scheduler_stop.wait(initial_delay):
+        return
+    while True:
+        try:
+            run_maintenance()
+        except Exception as e:
+            logger.error(f"Maintenance run failed: {e}")
+        if _scheduler_stop.wait(interval_seconds):
+            return
+
+
+def start_maintenance_scheduler(interval_hours: float = MAINTENANCE_INTERVAL_HOURS,
+                                initial_delay: float = MAINTENANCE_INITIAL_DELAY_SECONDS):
+    """Run maintenance every ``interval_hours`` on a daemon thread; started at most once per process"""
+    global _scheduler
+    if not MAINTENANCE_ENABLED or interval_hours <= 0:
+        return
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.is_alive():
+            return
+        _scheduler_stop.clear()
+        _scheduler = threading.Thread(target=_scheduler_loop, args=(interval_hours * 3600, initial_delay),
+                                      name="sqlite-maintenance", daemon=True)
+        _scheduler.start()
+
+
+def stop_maintenance_scheduler():
+    _scheduler_stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Purge, compact and report on the app databases")
+    parser.add_argument("--run", action="store_true", help="purge expired rows and compact (default: report only)")
+    parser.add_argument("--report", action="store_true", help="print size and fragmentation per database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Registers the app's retention policies and blob references without importing the app
+    importlib.import_module("app.utils.retention")
+    from app.utils.llm_cache import get_llm_cache
+    get_llm_cache()  # the response cache registers its own purge when opened
+
+    result = run_maintenance() if args.run else {"databases": maintenance_report()}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    # Run the imported module, the one the table owners register with, not this __main__ copy
+    importlib.import_module("app.utils.maintenance").main()
@@ -0,0 +1,242 @@
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Dict, Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRateLimitError(RuntimeError):
+    """Raised when a call is still being throttled after all retries"""
+
+
+def get_status_code(exc: BaseException) -> Optional[int]:
+    """Return the HTTP status carried by a provider exception, if any"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return get_status_code(exc) == 429
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = get_status_code(exc)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def get_retry_after(exc: BaseException) -> Optional[float]:
+    """Read the provider's Retry-After hint (seconds or HTTP date) from an exception"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate_per_minute``"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` tokens and return how long the caller must wait before using them"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def drain(self):
+        """Empty the bucket, e.g. after the provider reports the window is exhausted"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: grow by one per window of successes, halve on throttling.
+
+    Other failures leave the limit unchanged.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False, succeeded: bool = True):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(float(self.minimum), self.limit / 2)
+            elif succeeded:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    """Provider-aware limiter: request and token buckets, adaptive concurrency and backoff"""
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 200000,
+                 max_concurrency: int = 8, max_retries: int = 5, base_delay: float = 1.0,
+                 max_delay: float = 60.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.request_bucket = TokenBucket(requests_per_minute, clock=clock)
+        self.token_bucket = TokenBucket(tokens_per_minute, clock=clock)
+        self.concurrency = AdaptiveConcurrency(initial=max(1, max_concurrency // 2),
+                                               maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "succeeded": 0,
+            "throttled": 0,
+            "retries": 0,
+            "failed": 0,
+            "wait_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", "500")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "200000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+        )
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _wait_for_budget(self, estimated_tokens: int):
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(estimated_tokens))
+        if delay > 0:
+            self._count("wait_seconds", delay)
+            self._sleep(delay)
+
+    def backoff_delay(self, attempt: int, exc: Optional[BaseException] = None) -> float:
+        """Retry-After when the provider gives one, otherwise full-jitter exponential backoff"""
+        retry_after = get_retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            # Small jitter so clients told the same Retry-After do not return in lockstep
+            return min(self.max_delay, retry_after + random.uniform(0, 0.1 + 0.2 * retry_after))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0):
+        """Admit one request: wait for bucket budget and a concurrency slot"""
+        self._wait_for_budget(estimated_tokens)
+        self.concurrency.acquire()
+        self._count("requests")
+        throttled = succeeded = False
+        try:
+            yield
+            succeeded = True
+        except BaseException as e:
+            throttled = is_rate_limited(e)
+            if throttled:
+                self._count("throttled")
+                self.request_bucket.drain()
+            raise
+        finally:
+            self.concurrency.release(throttled=throttled, succeeded=succeeded)
+
+    def _retry_or_raise(self, attempt: int, exc: Exception, retryable: bool = True):
+        """Sleep before the next attempt, or raise ``exc`` when it is final"""
+        if not retryable or not is_retryable(exc) or attempt == self.max_retries:
+            self._count("failed")
+            if retryable and is_rate_limited(exc):
+                raise LLMRateLimitError(f"Rate limited after {attempt + 1} attempts: {exc}") from exc
+            raise exc
+        delay = self.backoff_delay(attempt, exc)
+        logger.warning(f"LLM call throttled or failed ({get_status_code(exc)}); retrying in {delay:.1f}s")
+        self._count("retries")
+        self._count("wait_seconds", delay)
+        self._sleep(delay)
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0):
+        """Run ``fn`` under the limiter, retrying throttled and transient failures"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(estimated_tokens):
+                    result = fn()
+                self._count("succeeded")
+                return result
+            except Exception as e:
+                self._retry_or_raise(attempt, e)
+
+    def stream(self, open_stream: Callable[[], Iterable[Any]], estimated_tokens: int = 0) -> Iterator[Any]:
+        """Yield the chunks of ``open_stream()`` under the limiter.
+
+        Throttled and transient failures are retried like ``call`` until the first
+        chunk arrives; after that a failure is raised, since the caller has output.
+        """
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                with self.slot(estimated_tokens):
+                    for chunk in open_stream():
+                        started = True
+                        yield chunk
+                self._count("succeeded")
+                return
+            except Exception as e:
+                self._retry_or_raise(attempt, e, retryable=not started)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of limiter counters and the current adaptive concurrency"""
+        with self._lock:
+            snapshot = dict(self._metrics)
+        snapshot["concurrency_limit"] = int(self.concurrency.limit)
+        snapshot["in_flight"] = self.concurrency.in_flight
+        return snapshot
+
+
+def estimate_request_tokens(prompt: str, max_tokens: int) -> int:
+    """Rough tokens-per-minute cost of a request: prompt at ~4 chars/token plus the output budget"""
+    return len(prompt) // 4 + max_tokens
@@ -0,0 +1,21 @@
+"""
+Retention policies and blob references of the app's own databases.
+
+Registered at import by the modules that own the tables (main.py and
+app/agents/followup_questions.py) and by the maintenance CLI, which needs the
+policies without importing Streamlit and the rest of the app.
+"""
+from app.utils.blob_store import register_blob_references
+from app.utils.maintenance import register_retention
+
+SESSIONS_DB = 'main_sessions.db'
+FOLLOWUP_DB = 'followup_data.db'
+
+# Sessions expire after RETENTION_DAYS_MAIN_SESSIONS (default RETENTION_DAYS) without activity
+register_retention(SESSIONS_DB, 'main_sessions', 'updated_at')
+register_retention(FOLLOWUP_DB, 'followup_sessions', 'created_at')
+register_retention(FOLLOWUP_DB, 'uploaded_files', 'upload_time')
+
+register_blob_references(FOLLOWUP_DB, 'uploaded_files', 'content_sha256')
+# Saved sessions keep their files as content_sha256 references inside the data JSON
+register_blob_references(SESSIONS_DB, 'main_sessions', 'data', json_key='content_sha256')
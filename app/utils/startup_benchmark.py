@@ -0,0 +1,101 @@
+"""
+Cold-start import benchmark for the Streamlit entry point.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter, reports the
+slowest modules, and exits non-zero when the total exceeds the budget or when a
+module that should load lazily was imported eagerly.
+
+    python -m app.utils.startup_benchmark --budget-ms 1500
+
+tests/test_startup.py runs the same check under pytest.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+
+# Loaded on first use only; importing any of these at startup is a regression
+LAZY_MODULES = ["langchain_openai", "openai", "httpx", "pandas", "PyPDF2", "requests",
+                "torch", "transformers"]
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure_imports(module: str = "main", cwd: str = None) -> List[Tuple[str, int, int, List[str]]]:
+    """Import ``module`` in a clean interpreter.
+
+    Returns (name, self_us, cumulative_us, importer chain) per imported module,
+    the chain running from the top-level import down to the direct importer.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # -X importtime prints children before parents, deeper ones more indented
+    timings = []
+    stack: List[Tuple[int, str]] = []
+    for line in reversed(result.stderr.splitlines()):
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent)
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        timings.append((name, int(self_us), int(cumulative_us), [parent for _, parent in stack]))
+        stack.append((depth, name))
+    return timings
+
+
+def _is_project_module(name: str, module: str) -> bool:
+    return name == module or name == "app" or name.startswith("app.")
+
+
+def check_startup(module: str = "main", budget_ms: float = STARTUP_IMPORT_BUDGET_MS,
+                  cwd: str = None, top: int = 15) -> Tuple[bool, List[str]]:
+    """Return (ok, report lines) for the module's cold import against the budget"""
+    timings = measure_imports(module, cwd)
+    total_ms = next((cumulative for name, _, cumulative, _ in timings if name == module), 0) / 1000
+
+    # A lazy module is a regression only when our own code is its direct importer
+    eager = set()
+    for name, _, _, chain in timings:
+        root = name.split(".")[0]
+        if root in LAZY_MODULES and chain and _is_project_module(chain[-1], module):
+            eager.add(f"{root} (from {chain[-1]})")
+
+    report = [f"import {module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)"]
+    report.append("slowest top-level packages (cumulative):")
+    top_level = [(name, cumulative) for name, _, cumulative, _ in timings if "." not in name]
+    for name, cumulative in sorted(top_level, key=lambda item: -item[1])[:top]:
+        report.append(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if eager:
+        report.append(f"eagerly imported by the app (should be lazy): {', '.join(sorted(eager))}")
+
+    ok = total_ms <= budget_ms and not eager
+    return ok, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold-start import time of the app")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    ok, report = check_startup(args.module, args.budget_ms, cwd=project_root, top=args.top)
+    print("\n".join(report))
+    print("OK" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+Shared SQLite storage for the app databases (followup_data.db, main_sessions.db).
+
+- One connection per database, shared by every thread in the process, so the
+  Streamlit rerun threads reuse it instead of reconnecting. Reads use it
+  directly; writes hold its lock through ``transaction()`` or ``locked()``.
+- WAL journaling with synchronous=NORMAL, so readers never block the writer and
+  commits skip the per-transaction fsync. Only a checkpoint fsyncs.
+- Schemas are registered by the module that owns the tables and migrated once
+  per process, not on every call.
+- Each connection keeps a statement cache, so SQL written as a module constant
+  is prepared once and re-executed.
+- Record writes can go through a write-behind queue (``enqueue_write``). A
+  background thread batches them into grouped transactions, and
+  ``flush_writes()`` is the barrier for reads that must see them.
+- Text columns can get an FTS5 index kept in sync by triggers
+  (``create_fts_index``) and are queried with ``search_records``.
+"""
+import atexit
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "8192"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+# Write-behind: PERSIST_WRITE_BEHIND=0 writes synchronously on the caller's thread
+PERSIST_WRITE_BEHIND = os.getenv("PERSIST_WRITE_BEHIND", "1") != "0"
+PERSIST_QUEUE_MAX = int(os.getenv("PERSIST_QUEUE_MAX", "10000"))
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "200"))
+PERSIST_FLUSH_INTERVAL_MS = int(os.getenv("PERSIST_FLUSH_INTERVAL_MS", "200"))
+
+Migration = Callable[[sqlite3.Connection], None]
+
+_schemas: Dict[str, List[Migration]] = {}
+_migrated: Set[str] = set()
+_schema_lock = threading.RLock()  # migrations may touch another registered database
+_pool: Dict[str, sqlite3.Connection] = {}
+_pool_locks: Dict[str, threading.RLock] = {}
+_pool_lock = threading.Lock()
+
+
+def _key(db_path: str) -> str:
+    return db_path if db_path == ":memory:" else os.path.abspath(db_path)
+
+
+def register_schema(db_path: str, migrate: Migration):
+    """Register a function that creates/migrates tables in ``db_path``.
+
+    Migrations run once per process, the first time the database is used, and
+    must be idempotent (CREATE TABLE IF NOT EXISTS, guarded ALTER TABLE).
+    """
+    with _schema_lock:
+        migrations = _schemas.setdefault(_key(db_path), [])
+        if migrate not in migrations:
+            migrations.append(migrate)
+            _migrated.discard(_key(db_path))
+
+
+def registered_databases() -> List[str]:
+    """Absolute paths of every database with a registered schema"""
+    with _schema_lock:
+        return [key for key in _schemas if key != ":memory:"]
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=SQLITE_STATEMENT_CACHE, check_same_thread=False)
+    # Only takes effect on a new database; app.utils.maintenance converts existing ones
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _ensure_schema(key: str, conn: sqlite3.Connection):
+    if key in _migrated:
+        return
+    with _schema_lock, _pool_locks[key]:
+        if key in _migrated:
+            return
+        for migrate in _schemas.get(key, []):
+            migrate(conn)
+        conn.commit()
+        _migrated.add(key)
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """The process-wide connection to ``db_path``, with its schema migrated.
+
+    Every thread shares it, so do not close it, and write only inside
+    ``transaction()`` or ``locked()``.
+    """
+    key = _key(db_path)
+    conn = _pool.get(key)
+    if conn is None:
+        with _pool_lock:
+            conn = _pool.get(key)
+            if conn is None:
+                _pool_locks[key] = threading.RLock()
+                conn = _pool[key] = _open(db_path)
+    _ensure_schema(key, conn)
+    return conn
+
+
+@contextmanager
+def locked(db_path: str) -> Iterator[sqlite3.Connection]:
+    """The shared connection with its write lock held, for statements that commit themselves"""
+    conn = get_connection(db_path)
+    with _pool_locks[_key(db_path)]:
+        yield conn
+
+
+@contextmanager
+def transaction(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Commit on success, roll back on error; other threads' writes wait until it ends"""
+    with locked(db_path) as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def close_connections():
+    """Close the pooled connections (at exit; the next get_connection reopens them)"""
+    with _pool_lock:
+        for key, conn in _pool.items():
+            try:
+                with _pool_locks[key]:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Error closing SQLite connection: {e}")
+        _pool.clear()
+
+atexit.register(close_connections)
+
+
+class _Barrier:
+    def __init__(self):
+        self.event = threading.Event()
+
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Background writer that groups queued statements into per-database transactions.
+
+    A batch is written once ``batch_size`` statements are queued or ``flush_interval``
+    seconds after its first one, whichever comes first. The queue is bounded, so
+    producers block (backpressure) instead of growing memory when the disk falls behind.
+    """
+
+    def __init__(self, max_depth: int = PERSIST_QUEUE_MAX, batch_size: int = PERSIST_BATCH_SIZE,
+                 flush_interval: float = PERSIST_FLUSH_INTERVAL_MS / 1000):
+        self._queue = queue.Queue(maxsize=max_depth)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="sqlite-write-behind", daemon=True)
+        self._thread.start()
+
+    def put(self, db_path: str, sql: str, params: Sequence[Any] = ()):
+        self._queue.put((db_path, sql, tuple(params)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued before this call is committed"""
+        if self._queue.unfinished_tasks == 0:
+            return True
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        return barrier.event.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Drain the queue and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _collect(self) -> List[Any]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not isinstance(batch[-1], _Barrier) and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._write([item for item in batch if isinstance(item, tuple)])
+            finally:
+                for item in batch:
+                    if isinstance(item, _Barrier):
+                        item.event.set()
+                    self._queue.task_done()
+            if batch[-1] is _STOP:
+                return
+
+    def _write(self, writes: List[tuple]):
+        if not writes:
+            return
+        by_db: Dict[str, List[tuple]] = {}
+        for db_path, sql, params in writes:
+            by_db.setdefault(db_path, []).append((sql, params))
+        for db_path, statements in by_db.items():
+            try:
+                with transaction(db_path) as conn:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+                self.written += len(statements)
+                self.batches += 1
+            except Exception as e:
+                logger.error(f"Batched write to {db_path} failed, retrying one by one: {e}")
+                for sql, params in statements:
+                    try:
+                        with transaction(db_path) as conn:
+                            conn.execute(sql, params)
+                        self.written += 1
+                    except Exception as e:
+                        self.failed += 1
+                        logger.error(f"Dropped write to {db_path}: {e}")
+
+
+_writer: Optional[WriteBehindQueue] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> WriteBehindQueue:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindQueue()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def enqueue_write(db_path: str, sql: str, params: Sequence[Any] = ()):
+    """Queue one statement for the background writer (or run it now with PERSIST_WRITE_BEHIND=0).
+
+    Pass values that are already serialized; the statement may run after the caller moved on.
+    """
+    if not PERSIST_WRITE_BEHIND:
+        with transaction(db_path) as conn:
+            conn.execute(sql, params)
+        return
+    _get_writer().put(db_path, sql, params)
+
+
+def flush_writes(timeout: Optional[float] = None) -> bool:
+    """Barrier: wait until every queued write is committed. True unless it timed out"""
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
+
+
+def write_behind_metrics() -> Dict[str, int]:
+    if _writer is None:
+        return {"queued": 0, "written": 0, "failed": 0, "batches": 0}
+    return {"queued": _writer._queue.qsize(), "written": _writer.written,
+            "failed": _writer.failed, "batches": _writer.batches}
+
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def create_fts_index(conn: sqlite3.Connection, table: str, columns: Sequence[str]) -> bool:
+    """External-content FTS5 index ``<table>_fts`` over ``columns``, kept in sync by triggers.
+
+    Meant to be called from a registered schema migration. ``table`` needs an integer
+    ``id`` primary key. An index created over existing rows is backfilled. Returns False
+    (and search falls back to LIKE) when this SQLite build has no FTS5.
+    """
+    if not fts5_available(conn):
+        logger.warning(f"SQLite has no FTS5; {table} search falls back to LIKE scans")
+        return False
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{c}" for c in columns)
+    old_cols = ", ".join(f"old.{c}" for c in columns)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)).fetchone()
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', "
+                 f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+    END""")
+    if not exists:
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return True
+
+
+def fts_match_query(keywords: str) -> str:
+    """User keywords as an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r"\w+", keywords or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_records(db_path: str, table: str, select: Sequence[str], text_columns: Sequence[str],
+                   keywords: str = "", since: Optional[str] = None, until: Optional[str] = None,
+                   time_column: str = "created_at", limit: int = 50,
+                   filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Rows of ``table`` matching ``keywords`` within [since, until], as dicts of ``select``.
+
+    ``filters`` are {column: value} conditions every row must meet (NULL matches NULL).
+
+    ``since``/``until`` compare against ``time_column`` (SQLite ``YYYY-MM-DD HH:MM:SS``
+    text; a bare date works as a lower bound). Keyword hits are ranked by relevance,
+    otherwise the newest rows come first.
+    """
+    flush_writes()
+    conn = get_connection(db_path)
+    where, params = [], []
+    if since:
+        where.append(f"t.{time_column} >= ?")
+        params.append(since)
+    if until:
+        where.append(f"t.{time_column} <= ?")
+        params.append(until)
+    for column, value in (filters or {}).items():
+        where.append(f"t.{column} IS ?")
+        params.append(value)
+
+    match = fts_match_query(keywords)
+    fts = f"{table}_fts"
+    has_fts = match and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)).fetchone()
+    columns = ", ".join(f"t.{c}" for c in select)
+    if has_fts:
+        sql = (f"SELECT {columns} FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+               f"WHERE {fts} MATCH ?{''.join(' AND ' + w for w in where)} ORDER BY {fts}.rank LIMIT ?")
+        params = [match, *params, limit]
+    else:
+        for word in re.findall(r"\w+", keywords or ""):
+            where.append("(" + " OR ".join(f"t.{c} LIKE ?" for c in text_columns) + ")")
+            params.extend([f"%{word}%"] * len(text_columns))
+        sql = (f"SELECT {columns} FROM {table} t{' WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY t.{time_column} DESC LIMIT ?")
+        params.append(limit)
+    return [dict(zip(select, row)) for row in conn.execute(sql, params)]
@@ -0,0 +1,274 @@
+"""
+Local OpenAI-compatible stub LLM server for offline benchmarking and load tests.
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1, or set
+LLM_STUB_SERVER=1 (or a path to a JSON config) to start it in-process.
+
+    python -m app.utils.stub_llm_server --port 8001 --config stub.json
+
+Config keys (all optional):
+    rules:     [{"pattern": "<regex>", "response": "<template>"}], first match wins;
+               templates may use {prompt} and {prompt_head}; double literal braces
+    latency:   {"distribution": "fixed|uniform|normal|lognormal", ...params} seconds
+               before the first token; "per_chunk" adds a delay between stream chunks
+    faults:    {"error_rate": 0.1, "status_codes": [429, 500], "retry_after": 1,
+                "truncate_rate": 0.05, "fail_first": 0}
+               "fail_first" fails the first N requests, for deterministic retry tests
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = [
+    {
+        "pattern": r"determine the user's technical skill level",
+        "response": '{{"skill_level": "intermediate", "reason": "Stub response: moderate technical detail in the goal"}}'
+    },
+    {
+        "pattern": r"SUBTASKS FOR THIS OBJECTIVE",
+        "response": (
+            "1. Analyze the objective and identify required data sources\n"
+            "2. Design the agent workflow and state structure\n"
+            "3. Implement the core processing logic for each step\n"
+            "4. Build the user interface and result displays\n"
+            "5. Test, validate and deploy the complete system"
+        )
+    },
+    {
+        "pattern": r"follow-up questions",
+        "response": (
+            "1. What specific inputs will the system receive and in what format?\n"
+            "2. Which environment and constraints must the solution run under?\n"
+            "3. How should the uploaded files be used in the workflow?\n"
+            "4. How will you measure whether the outcome is successful?\n"
+            "5. Which technologies or frameworks do you prefer for implementation?"
+        )
+    },
+    {
+        "pattern": r"modifying a list of subtasks",
+        "response": (
+            "1. Define requirements and data sources\n"
+            "2. Design system architecture\n"
+            "3. Implement core functionality\n"
+            "4. Add security validation\n"
+            "5. Deploy and test system"
+        )
+    },
+    {
+        "pattern": r".*",
+        "response": "Mock LLM response for: {prompt_head}..."
+    },
+]
+
+DEFAULT_CONFIG = {
+    "rules": DEFAULT_RULES,
+    "latency": {"distribution": "fixed", "value": 0.0, "per_chunk": 0.0},
+    "faults": {"error_rate": 0.0, "status_codes": [429], "retry_after": 1, "truncate_rate": 0.0,
+               "fail_first": 0},
+}
+
+
+def sample_latency(spec: Dict[str, Any]) -> float:
+    """Draw a delay in seconds from a latency distribution spec"""
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "uniform":
+        delay = random.uniform(spec.get("low", 0.0), spec.get("high", 1.0))
+    elif distribution == "normal":
+        delay = random.gauss(spec.get("mean", 0.5), spec.get("stddev", 0.1))
+    elif distribution == "lognormal":
+        delay = random.lognormvariate(spec.get("mu", -1.0), spec.get("sigma", 0.5))
+    else:
+        delay = spec.get("value", 0.0)
+    return max(0.0, delay)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubLLMBackend:
+    """Prompt matching, latency and fault injection behind the HTTP handler"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.rules = [(re.compile(rule["pattern"]), rule["response"])
+                      for rule in config.get("rules", DEFAULT_RULES)]
+        self.latency = {**DEFAULT_CONFIG["latency"], **config.get("latency", {})}
+        self.faults = {**DEFAULT_CONFIG["faults"], **config.get("faults", {})}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "truncated": 0}
+
+    def _count(self, name: str) -> int:
+        with self._lock:
+            self.stats[name] += 1
+            return self.stats[name]
+
+    def render(self, prompt: str) -> str:
+        for pattern, template in self.rules:
+            if pattern.search(prompt):
+                return template.format(prompt=prompt, prompt_head=prompt.strip()[:50])
+        return ""
+
+    def respond(self, prompt: str) -> Tuple[Optional[int], str, str]:
+        """Return (error status or None, text, finish_reason) after injected latency"""
+        request_number = self._count("requests")
+        time.sleep(sample_latency(self.latency))
+
+        if (request_number <= self.faults.get("fail_first", 0)
+                or random.random() < self.faults.get("error_rate", 0.0)):
+            self._count("errors")
+            return random.choice(self.faults.get("status_codes", [429])), "", "error"
+
+        text = self.render(prompt)
+        if text and random.random() < self.faults.get("truncate_rate", 0.0):
+            self._count("truncated")
+            return None, text[:random.randint(1, len(text))], "length"
+        return None, text, "stop"
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    backend: StubLLMBackend = None
+
+    def log_message(self, format, *args):
+        logger.debug("stub llm: " + format, *args)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        messages = request.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+        model = request.get("model", "stub-model")
+
+        status, text, finish_reason = self.backend.respond(prompt)
+        if status is not None:
+            headers = {"Retry-After": str(self.backend.faults.get("retry_after", 1))} if status == 429 else {}
+            self._send_json(status, {"error": {"message": f"Injected stub error {status}",
+                                               "type": "stub_error", "code": status}}, headers)
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(text),
+            "total_tokens": estimate_tokens(prompt) + estimate_tokens(text),
+        }
+
+        if request.get("stream"):
+            self._stream(completion_id, model, text, finish_reason)
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, model: str, text: str, finish_reason: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(delta: Dict[str, Any], reason: Optional[str] = None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        per_chunk = self.backend.latency.get("per_chunk", 0.0)
+        for piece in re.findall(r"\S+\s*|\s+", text):
+            if per_chunk:
+                time.sleep(per_chunk)
+            send({"content": piece})
+        send({}, finish_reason)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def load_config(path: Optional[str]) -> Dict[str, Any]:
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_stub_server(config: Optional[Dict[str, Any]] = None, host: str = "127.0.0.1",
+                     port: int = 0) -> ThreadingHTTPServer:
+    """Build a stub server bound to (host, port) with its own backend state"""
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {"backend": StubLLMBackend(config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(config: Optional[Dict[str, Any]] = None, host: str = "127.0.0.1",
+                      port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a daemon thread and return (server, base_url)"""
+    server = make_stub_server(config, host, port)
+    thread = threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    logger.info(f"Stub LLM server listening on {base_url}")
+    return server, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--config", help="JSON file with rules, latency and faults")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    server = make_stub_server(load_config(args.config), args.host, args.port)
+    print(f"Stub LLM server listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
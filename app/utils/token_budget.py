@@ -0,0 +1,132 @@
+import os
+import re
+from typing import Dict, Hashable, List, Tuple
+
+# Context budgets (tokens) for the file/answer material spliced into each prompt
+FILE_ANALYSIS_BUDGET = int(os.getenv("FILE_ANALYSIS_TOKEN_BUDGET", "3000"))
+SUBTASK_FILE_BUDGET = int(os.getenv("SUBTASK_FILE_TOKEN_BUDGET", "400"))
+QUESTION_FILE_BUDGET = int(os.getenv("QUESTION_FILE_TOKEN_BUDGET", "800"))
+REFINE_CONTEXT_BUDGET = int(os.getenv("REFINE_CONTEXT_TOKEN_BUDGET", "2500"))
+INTEGRATION_FILE_BUDGET = int(os.getenv("INTEGRATION_FILE_TOKEN_BUDGET", "1500"))
+
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, else estimate at ~4 characters per token"""
+    global _encoder
+    if not text:
+        return 0
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def collapse_whitespace(text: str) -> str:
+    """Trim trailing spaces, squeeze runs of blanks and limit blank lines to one"""
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r' *\n', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def dedupe_lines(text: str) -> str:
+    """Drop repeated non-empty lines (e.g. duplicate CSV rows), noting how many were removed"""
+    seen = set()
+    kept = []
+    removed = 0
+    for line in text.split('\n'):
+        if line.strip() and line in seen:
+            removed += 1
+            continue
+        seen.add(line)
+        kept.append(line)
+    if removed:
+        kept.append(f"[{removed} duplicate lines removed]")
+    return '\n'.join(kept)
+
+
+def head_tail_sample(text: str, max_tokens: int) -> str:
+    """Keep the beginning and end of ``text`` within ``max_tokens``, marking what was cut"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    lines = text.split('\n')
+    if len(lines) > 3:
+        # Two thirds of the budget for the head (headers, first rows), the rest for the tail
+        head, tail = [], []
+        head_budget = max_tokens * 2 // 3
+        used = 0
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if used + cost > head_budget:
+                break
+            head.append(line)
+            used += cost
+        for line in reversed(lines[len(head):]):
+            cost = count_tokens(line) + 1
+            if used + cost > max_tokens - 8:
+                break
+            tail.insert(0, line)
+            used += cost
+        omitted = len(lines) - len(head) - len(tail)
+        if head or tail:
+            return '\n'.join(head + [f"... [{omitted} lines omitted] ..."] + tail)
+
+    # A few very long lines: cut by characters instead
+    chars = max(0, max_tokens * 4 - 40)
+    return f"{text[:chars * 2 // 3]} ... [truncated] ... {text[len(text) - chars // 3:]}"
+
+
+def compress_text(text: str, max_tokens: int) -> str:
+    """Shrink ``text`` to fit ``max_tokens``: whitespace collapse, line dedup, then head/tail sampling"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    text = collapse_whitespace(text)
+    if count_tokens(text) <= max_tokens:
+        return text
+    text = dedupe_lines(text)
+    return head_tail_sample(text, max_tokens)
+
+
+def allocate_budget(needs: Dict[Hashable, int], total: int) -> Dict[Hashable, int]:
+    """Split ``total`` tokens across sections by water-filling: small sections get all they
+    need and the remainder is shared equally by the larger ones"""
+    allocation = {}
+    remaining = total
+    pending = sorted(needs.items(), key=lambda item: item[1])
+    while pending:
+        share = remaining // len(pending)
+        name, need = pending[0]
+        if need <= share:
+            allocation[name] = need
+            remaining -= need
+            pending.pop(0)
+        else:
+            for name, _ in pending:
+                allocation[name] = share
+            break
+    return allocation
+
+
+def fit_sections(sections: List[Tuple[str, str]], total: int) -> List[Tuple[str, str]]:
+    """Compress each (name, text) section so that together they fit in ``total`` tokens.
+
+    Sections are budgeted by position, so repeated names (e.g. two uploads of data.csv) are fine.
+    """
+    allocation = allocate_budget({i: count_tokens(text) for i, (_, text) in enumerate(sections)}, total)
+    return [(name, compress_text(text, allocation[i])) for i, (name, text) in enumerate(sections)]
+
+
+def fit_files(files: List[Dict], total: int, content_key: str = 'content',
+              name_key: str = 'filename') -> List[Tuple[str, str]]:
+    """(filename, compressed content) for uploaded-file dicts sharing a ``total`` token budget"""
+    return fit_sections([(file_data.get(name_key, ''), file_data.get(content_key) or '') for file_data in files],
+                        total)
@@ -3,11 +3,15 @@ import os
 import streamlit as st
 import os
 import sqlite3
-import pandas as pd
 import json
 import base64
-from app.agents.user_skill_level import determine_user_skill_level
-from app.agents.code import generate_production_code
+import logging
+import re
+import uuid
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, wait
+from app.agents.pipeline import detect_skill, generate_subtasks
 from app.agents.subtasks import (
     classify_into_subtasks, 
     render_subtasks_for_review, 
@@ -15,13 +19,29 @@ from app.agents.subtasks import (
 )
 from app.agents.followup_questions import (
     render_followup_questions_with_upload,
+    prefetch_followup_questions,
+    search_followup_sessions,
     init_followup_db
 )
 from app.rag.analyse_files import analyze_file_requirements
-from app.agents.explain_code import explain_code
-from app.agents.api_service import APIService
+from app.agents.artifacts import (
+    start_stage4_artifacts,
+    get_stage4_artifact,
+    discard_stage4_artifacts,
+    pending_stage4_artifacts
+)
+from app.utils.constants import prewarm_clients, submit_llm_task
+from app.utils.storage import (
+    get_connection, register_schema, enqueue_write, flush_writes, create_fts_index, search_records
+)
+from app.utils.maintenance import start_maintenance_scheduler
+from app.utils.blob_store import get_blob_text, put_blob
+from app.utils.retention import SESSIONS_DB
+from app.ui.background import ScriptThreadRelay, streamlit_notify
 # from app.agents.reasoning import apply_reasoning
 
+logger = logging.getLogger(__name__)
+
 # Custom CSS for modern UI with logo
 def load_custom_css():
     st.markdown("""
@@ -156,9 +176,8 @@ def render_fixed_logo():
         """, unsafe_allow_html=True)
 
 # Initialize database functions (keeping your existing ones)
-def initialize_session_database():
-    """Initialize database for session management"""
-    conn = sqlite3.connect('main_sessions.db')
+def _create_session_tables(conn: sqlite3.Connection):
+    """Create/migrate the session table; run once per process by the storage layer"""
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS main_sessions (
@@ -175,45 +194,248 @@ def initialize_session_database():
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    conn.commit()
-    return conn
+    # Columns added for session resume; add them to databases created before
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(main_sessions)")}
+    for column, column_type in {**SESSION_RESUME_COLUMNS, 'owner': 'TEXT'}.items():
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE main_sessions ADD COLUMN {column} {column_type}")
+    # Rows saved before credentials and file bodies were stripped; rewritten once per database
+    if cursor.execute("PRAGMA user_version").fetchone()[0] < 1:
+        rows = cursor.execute("SELECT id, data FROM main_sessions WHERE data IS NOT NULL").fetchall()
+        for row_id, data in rows:
+            try:
+                saved = persistable_session_data(json.loads(data))
+            except (ValueError, TypeError):
+                continue
+            cursor.execute("UPDATE main_sessions SET data = ?, uploaded_files = ? WHERE id = ?",
+                           (json.dumps(saved, default=str),
+                            json.dumps(saved.get('uploaded_files', []), default=str), row_id))
+        cursor.execute("PRAGMA user_version = 1")
+    # session_id lookups are covered by its UNIQUE index
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_main_sessions_created_at ON main_sessions (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_main_sessions_updated_at ON main_sessions (updated_at)')
+    create_fts_index(conn, 'main_sessions', SESSION_SEARCH_COLUMNS)
 
-def save_session_state(session_id: str):
-    """Save current session state to database"""
-    conn = initialize_session_database()
-    cursor = conn.cursor()
+register_schema(SESSIONS_DB, _create_session_tables)
+
+def initialize_session_database():
+    """The process-wide shared connection to the session database (do not close it)"""
+    return get_connection(SESSIONS_DB)
+
+# Full state needed to render a session again without any LLM calls
+SESSION_RESUME_COLUMNS = {
+    'data': 'TEXT',
+    'generated_code': 'TEXT',
+    'code_explanation': 'TEXT',
+    'tool_suggestions': 'TEXT'
+}
+
+# Text columns covered by the main_sessions full-text index
+SESSION_SEARCH_COLUMNS = ('agent_name', 'goal', 'refined_goal', 'subtasks')
+
+# Support deployments only: search and resume every user's sessions
+SESSION_SUPPORT_MODE = os.getenv("SESSION_SUPPORT_MODE", "0") == "1"
+
+# Session ids double as the resume token in the URL, so they must be unguessable
+SESSION_ID_PATTERN = re.compile(r"session_[0-9a-f]{32}")
+
+def new_session_id() -> str:
+    return f"session_{uuid.uuid4().hex}"
+
+def current_user_id() -> Optional[str]:
+    """The signed-in user's identity when Streamlit authentication is configured, else None"""
+    user = getattr(st, 'user', None) or getattr(st, 'experimental_user', None)
     try:
+        if user is not None and user.get('is_logged_in', True):
+            return user.get('email') or user.get('sub')
+    except Exception:
+        pass
+    return None
+
+# Never written to SQLite; the user re-enters them after a resume
+DB_CONFIG_SECRET_KEYS = ('password', 'connection_string')
+FILE_LIST_KEYS = ('uploaded_files', 'question_specific_files')
+
+def _file_reference(file_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Uploaded-file metadata plus its blob store reference, without the contents"""
+    reference = {k: v for k, v in file_data.items() if k not in ('content', 'processed_data')}
+    if not reference.get('content_sha256') and file_data.get('content'):
+        reference['content_sha256'] = put_blob(file_data['content'].encode('utf-8'), file_data['content'])
+    return reference
+
+def persistable_session_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of ``data`` safe to store: no database credentials, files only as blob references"""
+    saved = dict(data)
+    for key in FILE_LIST_KEYS:
+        if saved.get(key):
+            saved[key] = [_file_reference(f) if isinstance(f, dict) else f for f in saved[key]]
+    if saved.get('database_configs'):
+        saved['database_configs'] = [
+            {k: v for k, v in config.items() if k not in DB_CONFIG_SECRET_KEYS} if isinstance(config, dict) else config
+            for config in saved['database_configs']
+        ]
+    return saved
+
+def _rehydrate_files(data: Dict[str, Any]):
+    """Load the contents of saved file references back from the blob store"""
+    for key in FILE_LIST_KEYS:
+        for file_data in data.get(key) or []:
+            if isinstance(file_data, dict) and 'content' not in file_data and file_data.get('content_sha256'):
+                file_data['content'] = get_blob_text(file_data['content_sha256']) or ''
+
+def save_session_state(session_id: str, announce: bool = True):
+    """Save current session state to database.
+
+    The row is serialized here and written by the background writer (see flush_writes).
+    """
+    try:
+        saved_data = persistable_session_data(st.session_state.data)
         session_data = {
             'session_id': session_id,
+            'owner': current_user_id(),
             'stage': st.session_state.stage,
             'agent_name': st.session_state.data.get('agent_name', ''),
             'goal': st.session_state.data.get('goal', ''),
             'refined_goal': st.session_state.data.get('refined_goal', ''),
             'subtasks': json.dumps(st.session_state.data.get('subtasks', [])),
             'skill_level': st.session_state.data.get('user_skill_level', ''),
-            'uploaded_files': json.dumps(st.session_state.data.get('uploaded_files', []))
+            'uploaded_files': json.dumps(saved_data.get('uploaded_files', []), default=str),
+            'data': json.dumps(saved_data, default=str),
+            'generated_code': st.session_state.get('generated_code'),
+            'code_explanation': json.dumps(st.session_state.get('code_explanation')),
+            'tool_suggestions': json.dumps(st.session_state.get('tool_suggestions'))
         }
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO main_sessions
-            (session_id, stage, agent_name, goal, refined_goal, subtasks, skill_level, uploaded_files)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        enqueue_write(SESSIONS_DB, '''
+            INSERT INTO main_sessions
+            (session_id, owner, stage, agent_name, goal, refined_goal, subtasks, skill_level, uploaded_files,
+             data, generated_code, code_explanation, tool_suggestions)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                stage = excluded.stage, agent_name = excluded.agent_name, goal = excluded.goal,
+                refined_goal = excluded.refined_goal, subtasks = excluded.subtasks,
+                skill_level = excluded.skill_level, uploaded_files = excluded.uploaded_files,
+                data = excluded.data, generated_code = excluded.generated_code,
+                code_explanation = excluded.code_explanation, tool_suggestions = excluded.tool_suggestions,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE main_sessions.owner IS excluded.owner
         ''', (
             session_data['session_id'],
+            session_data['owner'],
             session_data['stage'],
             session_data['agent_name'],
             session_data['goal'],
             session_data['refined_goal'],
             session_data['subtasks'],
             session_data['skill_level'],
-            session_data['uploaded_files']
+            session_data['uploaded_files'],
+            session_data['data'],
+            session_data['generated_code'],
+            session_data['code_explanation'],
+            session_data['tool_suggestions']
         ))
-        conn.commit()
-        st.success(f"✅ Session saved: {session_id}")
+        if announce:
+            st.success(f"✅ Session saved: {session_id}")
     except Exception as e:
         st.error(f"Error saving session: {e}")
-    finally:
-        conn.close()
+
+def load_session_state(session_id: str) -> Optional[Dict[str, Any]]:
+    """Persisted session row, or None if the session was never saved"""
+    flush_writes()
+    conn = initialize_session_database()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT stage, data, generated_code, code_explanation, tool_suggestions, owner
+            FROM main_sessions WHERE session_id = ?
+        ''', (session_id,))
+        row = cursor.fetchone()
+        if not row or not row[1]:
+            return None
+        data = json.loads(row[1])
+        # JSON turns the answer indices into strings
+        if data.get('followup_answers'):
+            data['followup_answers'] = {int(k): v for k, v in data['followup_answers'].items()}
+        return {
+            'stage': row[0],
+            'data': data,
+            'generated_code': row[2],
+            'code_explanation': json.loads(row[3]) if row[3] else None,
+            'tool_suggestions': json.loads(row[4]) if row[4] else None,
+            'owner': row[5]
+        }
+    except Exception as e:
+        st.error(f"Error loading session: {e}")
+        return None
+
+def search_sessions(keywords: str = "", since: Optional[str] = None, until: Optional[str] = None,
+                    limit: int = 20, owner: Optional[str] = None, all_owners: bool = False) -> List[Dict[str, Any]]:
+    """Past sessions of ``owner`` (every user's with ``all_owners``) matching ``keywords``
+    in their objective, subtasks, questions or answers.
+
+    Matches from main_sessions come first, then sessions only found through their
+    follow-up questions and answers. ``since``/``until`` bound created_at (UTC).
+    """
+    filters = None if all_owners else {'owner': owner}
+    try:
+        results = search_records(SESSIONS_DB, 'main_sessions',
+                                 ('session_id', 'agent_name', 'goal', 'stage', 'created_at'),
+                                 SESSION_SEARCH_COLUMNS, keywords, since, until, limit=limit, filters=filters)
+    except Exception as e:
+        logger.error(f"Error searching sessions: {e}")
+        results = []
+    found = {row['session_id'] for row in results}
+    followup_hits = [row for row in search_followup_sessions(keywords, since, until, limit=limit)
+                     if row['session_id'] not in found]
+    if followup_hits and not all_owners:
+        # followup_sessions has no owner; keep only sessions main_sessions records for this owner
+        ids = [row['session_id'] for row in followup_hits]
+        owned = {row[0] for row in initialize_session_database().execute(
+            f"SELECT session_id FROM main_sessions WHERE owner IS ? AND session_id IN ({','.join('?' * len(ids))})",
+            (owner, *ids))}
+        followup_hits = [row for row in followup_hits if row['session_id'] in owned]
+    for row in followup_hits:
+        if row['session_id'] not in found:
+            found.add(row['session_id'])
+            results.append({'session_id': row['session_id'], 'agent_name': '', 'goal': row['objective'],
+                            'stage': None, 'created_at': row['created_at']})
+    return results[:limit]
+
+def restore_session(session_id: str) -> bool:
+    """Rehydrate st.session_state from a saved session; finished artifacts are reused as-is.
+
+    Only sessions with an unguessable id that belong to the current user can be resumed.
+    """
+    if not SESSION_ID_PATTERN.fullmatch(session_id or ''):
+        return False
+    saved = load_session_state(session_id)
+    if not saved:
+        return False
+    if saved['owner'] != current_user_id() and not SESSION_SUPPORT_MODE:
+        logger.warning(f"Refused to resume session {session_id} owned by another user")
+        return False
+    _rehydrate_files(saved['data'])
+    st.session_state.stage = saved['stage']
+    st.session_state.data = saved['data']
+    st.session_state.session_id = session_id
+    st.session_state.mode = 'workflow'
+    for artifact in ('generated_code', 'code_explanation', 'tool_suggestions'):
+        st.session_state[artifact] = saved[artifact]
+    if saved['stage'] == 4:
+        start_stage4_artifacts(st.session_state, session_id, st.session_state.data, done={
+            'file_analysis': saved['data'].get('file_analysis'),
+            'generated_code': saved['generated_code'],
+            'code_explanation': saved['code_explanation'],
+            'tool_suggestions': saved['tool_suggestions']
+        })
+        st.session_state.saved_artifacts_for = session_id
+    return True
+
+def clear_session():
+    """Drop all session state and the session_id query param so a fresh session starts"""
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    st.query_params.clear()
 
 def render_subtasks_for_review(subtasks: list, goal: str, key_prefix="subtask_review"):
     """Generalized subtask editor"""
@@ -324,6 +546,7 @@ def render_api_design_section():
     
     # Initialize API service if not exists
     if 'api_service' not in st.session_state:
+        from app.agents.api_service import APIService  # deferred: pulls in requests
         st.session_state.api_service = APIService()
     
     # API Configuration Section
@@ -488,10 +711,49 @@ def render_sidebar():
         
         # Clear Workflow Button
         if st.button("🗑️ Clear Workflow"):
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
+            clear_session()
             st.rerun()
 
+        render_session_search()
+
+# Lower bounds for the session search time filter
+SEARCH_WINDOWS = {
+    "Any time": None,
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+}
+
+def render_session_search():
+    """Sidebar search over past sessions, with links that reopen them.
+
+    Signed-in users search their own sessions; every session is searchable only in
+    SESSION_SUPPORT_MODE. Anonymous users get no search, since their sessions have no owner.
+    """
+    owner = current_user_id()
+    if owner is None and not SESSION_SUPPORT_MODE:
+        return
+    st.markdown("### 🔎 Session History")
+    keywords = st.text_input("Search past sessions", key="session_search_keywords",
+                             placeholder="Keywords from the objective or answers")
+    window = st.selectbox("Created", list(SEARCH_WINDOWS), key="session_search_window")
+    if not keywords.strip() and SEARCH_WINDOWS[window] is None:
+        return
+    since = None
+    if SEARCH_WINDOWS[window] is not None:
+        since = (datetime.utcnow() - SEARCH_WINDOWS[window]).strftime('%Y-%m-%d %H:%M:%S')
+    results = search_sessions(keywords, since=since, owner=owner, all_owners=SESSION_SUPPORT_MODE)
+    if not results:
+        st.caption("No matching sessions")
+    for row in results:
+        title = (row['goal'] or row['agent_name'] or row['session_id']).strip().replace('\n', ' ')
+        title = title.replace('[', '(').replace(']', ')')
+        if len(title) > 60:
+            title = title[:57] + "..."
+        stage = f" · stage {row['stage']}" if row['stage'] else ""
+        st.markdown(f"[{title}](?session_id={row['session_id']})  \n"
+                    f"<small>{row['created_at']}{stage}</small>", unsafe_allow_html=True)
+
 def main():
     # Set page config
     st.set_page_config(
@@ -509,13 +771,26 @@ def main():
     
     # Initialize database
     init_followup_db()
+    start_maintenance_scheduler()
+
+    # Open LLM connections early and build the clients the stage 1-3 agents use
+    prewarm_clients([
+        {"max_tokens": 300},
+        {"max_tokens": 800, "temperature": 0.2},
+        {"max_tokens": 512},
+        {"max_tokens": 1024},
+    ])
     
-    # Session state initialization
+    # Session state initialization: resume the session named in the URL, else start a new one
     if 'stage' not in st.session_state:
-        st.session_state.stage = 1
-        st.session_state.data = {}
-        st.session_state.session_id = f"session_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}"
-        st.session_state.mode = 'workflow'
+        resume_id = st.query_params.get("session_id")
+        if not (resume_id and restore_session(resume_id)):
+            st.session_state.stage = 1
+            st.session_state.data = {}
+            st.session_state.session_id = new_session_id()
+            st.session_state.mode = 'workflow'
+    if st.query_params.get("session_id") != st.session_state.session_id:
+        st.query_params["session_id"] = st.session_state.session_id
     
     # Render sidebar
     render_sidebar()
@@ -546,24 +821,60 @@ def main():
                     'goal': goal.strip()
                 })
                 
-                with st.spinner("🔍 Analyzing your objective..."):
-                    skill_analysis = determine_user_skill_level(goal.strip())
-                    st.session_state.data['user_skill_level'] = skill_analysis['skill_level']
-                    st.session_state.data['skill_reason'] = skill_analysis['reason']
-                
-                with st.spinner("⚡ Generating subtasks from your objective..."):
+                # Skill detection and subtask generation only need the goal, so run them
+                # concurrently and render each result on this thread as it lands
+                skill_slot = st.empty()
+                live_subtasks = st.empty()
+                streamed_subtasks = []
+                failed = []
+
+                def show_subtask(task: str):
+                    streamed_subtasks.append(task)
+                    live_subtasks.markdown(
+                        "\n".join(f"{i}. {t}" for i, t in enumerate(streamed_subtasks, 1))
+                    )
+
+                def show_progress(step, event, payload):
+                    if event == 'item':
+                        show_subtask(payload)
+                    elif event == 'status':
+                        streamlit_notify(*payload)
+
+                def on_stage1_done(name, future):
                     try:
-                        subtasks = classify_into_subtasks(goal.strip())
-                        if not subtasks:
-                            st.error("Failed to generate subtasks. Please try again.")
-                            return
-                        st.session_state.data['subtasks'] = subtasks
-                        st.success(f"✅ Generated {len(subtasks)} subtasks!")
+                        updates = future.result()
                     except Exception as e:
                         st.error(f"Error generating subtasks: {e}")
+                        failed.append(name)
+                        return
+                    if name == 'skill':
+                        st.session_state.data.update(updates)
+                        skill_slot.success(f"🔍 **Detected Skill Level:** {updates['user_skill_level'].upper()}")
                         return
+                    if not updates['subtasks']:
+                        st.error("Failed to generate subtasks. Please try again.")
+                        failed.append(name)
+                        return
+                    st.session_state.data.update(updates)
+                    st.success(f"✅ Generated {len(updates['subtasks'])} subtasks!")
+
+                # The pipeline steps run on worker threads; their progress is replayed here
+                relay = ScriptThreadRelay()
+                progress = relay.callback('progress')
+                state = dict(st.session_state.data)
+                stage1_futures = {
+                    'skill': submit_llm_task(detect_skill, state, progress),
+                    'subtasks': submit_llm_task(generate_subtasks, state, progress,
+                                                st.session_state.get('uploaded_files', [])),
+                }
+                with st.spinner("⚡ Analyzing your objective and generating subtasks..."):
+                    relay.pump(stage1_futures, {'progress': show_progress}, on_stage1_done)
+
+                if failed:
+                    return
                 
                 st.session_state.stage = 2
+                save_session_state(st.session_state.session_id, announce=False)
                 st.rerun()
             else:
                 st.error("Please describe what you'd like to accomplish")
@@ -583,6 +894,13 @@ def main():
         # Get current subtasks
         subtasks = st.session_state.data.get('subtasks', [])
         goal = st.session_state.data.get('goal', '')
+
+        # Start on stage 3's questions while the user reviews the subtasks
+        prefetch_followup_questions(
+            st.session_state.session_id,
+            goal,
+            st.session_state.data.get('user_skill_level', 'intermediate')
+        )
         
         # Use the render_subtasks_for_review function
         result = render_subtasks_for_review(subtasks, goal, "stage2")
@@ -598,6 +916,7 @@ def main():
                 st.write("**Updated Subtasks:**")
                 for i, task in enumerate(result["subtasks"], 1):
                     st.write(f"{i}. {task}")
+                save_session_state(st.session_state.session_id, announce=False)
                 st.rerun()
             
             # Force rerun to show changes
@@ -607,8 +926,9 @@ def main():
                 with st.spinner("🔄 Regenerating subtasks..."):
                     try:
                         goal = st.session_state.data.get('goal', '')
-                        subtasks = classify_into_subtasks(goal)
+                        subtasks = classify_into_subtasks(goal, use_cache=False)
                         st.session_state.data['subtasks'] = subtasks
+                        save_session_state(st.session_state.session_id, announce=False)
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error regenerating subtasks: {e}")
@@ -616,6 +936,7 @@ def main():
             elif result["action"] == "continue":
                 # Move to follow-up questions stage
                 st.session_state.stage = 3
+                save_session_state(st.session_state.session_id, announce=False)
                 st.rerun()
         
         # Back button
@@ -648,8 +969,17 @@ def main():
             
             })
 
+            # Kick off every stage-4 artifact now so the tabs fill in as they finish;
+            # results from an earlier submission of this session are stale
+            discard_stage4_artifacts(st.session_state, st.session_state.session_id)
+            st.session_state.data.pop('file_analysis', None)
+            st.session_state.generated_code = None
+            st.session_state.code_explanation = None
+            st.session_state.saved_artifacts_for = None
+            start_stage4_artifacts(st.session_state, st.session_state.session_id, st.session_state.data)
             
             st.session_state.stage = 4
+            save_session_state(st.session_state.session_id, announce=False)
             st.rerun()
         
         
@@ -669,6 +999,20 @@ def main():
         if 'tool_suggestions' not in st.session_state:
             st.session_state.tool_suggestions = None
 
+        # Artifacts run in the background (started when stage 3 was submitted);
+        # each rerun only collects whatever has finished, so tabs never trigger work
+        session_id = st.session_state.session_id
+        start_stage4_artifacts(st.session_state, session_id, st.session_state.data)
+        artifact_errors = {}
+        for artifact in ('file_analysis', 'generated_code', 'code_explanation'):
+            ready, value, error = get_stage4_artifact(st.session_state, session_id, artifact)
+            if error:
+                artifact_errors[artifact] = error
+            elif ready and artifact == 'file_analysis':
+                st.session_state.data['file_analysis'] = value
+            elif ready:
+                st.session_state[artifact] = value
+
         # Create tabs for different analyses
         tabs = st.tabs([
             "🎯 Objective Analysis",
@@ -723,12 +1067,10 @@ def main():
         # File Analysis Tab
         with tabs[4]:
             st.subheader("📁 File Analysis")
-            if not st.session_state.data.get('file_analysis'):
-                with st.spinner("Analyzing file requirements..."):
-                    file_analysis = analyze_file_requirements(
-                        st.session_state.data.get('followup_answers', {})
-                    )
-                    st.session_state.data['file_analysis'] = file_analysis
+            if 'file_analysis' in artifact_errors:
+                st.error(f"File analysis failed: {artifact_errors['file_analysis']}")
+            elif 'file_analysis' not in st.session_state.data:
+                st.info("⏳ Analyzing file requirements...")
 
             if st.session_state.data.get('uploaded_files'):
                 st.markdown("**📤 Uploaded Files:**")
@@ -772,14 +1114,10 @@ def main():
         # Generated Code Tab
         with tabs[7]:
             st.subheader("💻 Generated Implementation")
-            if not st.session_state.generated_code:
-                with st.spinner("⚡ Generating production code..."):
-                    enhanced_data = st.session_state.data.copy()
-                    if st.session_state.data.get('uploaded_files'):
-                        enhanced_data['file_integration_required'] = True
-                        enhanced_data['database_required'] = True
-                        enhanced_data['file_types'] = [f['file_type'] for f in st.session_state.data['uploaded_files']]
-                    st.session_state.generated_code = generate_production_code(enhanced_data)
+            if 'generated_code' in artifact_errors:
+                st.error(f"Code generation failed: {artifact_errors['generated_code']}")
+            elif not st.session_state.generated_code:
+                st.info("⏳ Generating production code...")
 
             if st.session_state.generated_code:
                 st.code(st.session_state.generated_code, language='python')
@@ -814,9 +1152,10 @@ def main():
         # Code Explanation Tab
         with tabs[8]:
             st.subheader("📖 Code Documentation & Explanation")
-            if not st.session_state.code_explanation and st.session_state.generated_code:
-                with st.spinner("Generating documentation..."):
-                    st.session_state.code_explanation = explain_code(st.session_state.data)
+            if 'code_explanation' in artifact_errors:
+                st.error(f"Documentation failed: {artifact_errors['code_explanation']}")
+            elif not st.session_state.code_explanation:
+                st.info("⏳ Generating documentation...")
 
             if st.session_state.code_explanation:
                 explanation_sections = [
@@ -850,11 +1189,20 @@ def main():
         # Reset button
         with st.container():
             if st.button("🔄 Generate New System", type="secondary"):
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
+                clear_session()
                 st.rerun()
 
         st.markdown('</div>', unsafe_allow_html=True)
 
+        # Re-render as soon as another artifact finishes (or periodically while any are pending);
+        # once all are in, persist them so a resumed session needs no LLM calls
+        pending = pending_stage4_artifacts(st.session_state, session_id)
+        if not pending and st.session_state.get('saved_artifacts_for') != session_id:
+            save_session_state(session_id, announce=False)
+            st.session_state.saved_artifacts_for = session_id
+        if pending:
+            wait(list(pending.values()), timeout=1.0, return_when=FIRST_COMPLETED)
+            st.rerun()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
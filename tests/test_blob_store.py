@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from app.utils import blob_store
+from app.utils.storage import flush_writes, register_schema, transaction
+
+
+def _create_sessions(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, data TEXT)")
+
+
+@pytest.fixture
+def blob_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "blobs.db")
+    register_schema(db_path, blob_store._create_blob_tables)
+    monkeypatch.setattr(blob_store, "BLOB_DB", db_path)
+    monkeypatch.setattr(blob_store, "_REFERENCES", [])
+    return db_path
+
+
+def _age_all_blobs(db_path):
+    flush_writes()
+    with transaction(db_path) as conn:
+        conn.execute("UPDATE file_blobs SET last_used_at = '2000-01-01 00:00:00'")
+
+
+def test_purge_keeps_blobs_referenced_from_json(blob_db, tmp_path):
+    sessions_db = str(tmp_path / "sessions.db")
+    register_schema(sessions_db, _create_sessions)
+    blob_store.register_blob_references(sessions_db, 'sessions', 'data', json_key='content_sha256')
+
+    kept = blob_store.put_blob(b"kept", "kept")
+    dropped = blob_store.put_blob(b"dropped", "dropped")
+    data = {'uploaded_files': [{'filename': 'a.txt', 'content_sha256': kept}]}
+    with transaction(sessions_db) as conn:
+        conn.execute("INSERT INTO sessions (data) VALUES (?)", (json.dumps(data),))
+    _age_all_blobs(blob_db)
+
+    assert blob_store.purge_unreferenced_blobs(grace_days=1) == 1
+    assert blob_store.get_blob_text(kept, wait=True) == "kept"
+    assert blob_store.get_blob(dropped, wait=True) is None
+
+
+def test_put_blob_rewrites_a_blob_whose_row_is_gone(blob_db):
+    sha256 = blob_store.put_blob(b"payload", "payload")
+    flush_writes()
+    with transaction(blob_db) as conn:
+        conn.execute("DELETE FROM file_blobs")
+
+    assert blob_store.put_blob(b"payload", "payload") == sha256
+    assert blob_store.get_blob(sha256, wait=True) == b"payload"
@@ -0,0 +1,60 @@
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from app.agents import pipeline
+from app.agents.graph import GENERATOR_GRAPH, GraphRun, Node, PipelineGraph
+
+
+def _toy_graph(calls: Counter) -> PipelineGraph:
+    def parity(state, progress=None):
+        calls['parity'] += 1
+        return {'parity': state['x'] % 2}
+
+    def label(state, progress=None):
+        calls['label'] += 1
+        return {'label': 'odd' if state['parity'] else 'even'}
+
+    def echo(state, progress=None):
+        calls['echo'] += 1
+        return {'echoed': state['w']}
+
+    return PipelineGraph([
+        Node('parity', parity, ['x'], ['parity']),
+        Node('label', label, ['parity'], ['label']),
+        Node('echo', echo, ['w'], ['echoed']),
+    ])
+
+
+def test_update_invalidates_readers_and_their_descendants():
+    calls = Counter()
+    graph_run = GraphRun({'x': 1, 'w': 'a'}, graph=_toy_graph(calls))
+    graph_run.run()
+
+    assert graph_run.update(x=1) == set()
+    assert graph_run.update(x=2) == {'parity', 'label'}
+    assert graph_run.update(w='b') == {'echo'}
+
+
+def test_rerun_skips_nodes_whose_inputs_fingerprint_the_same():
+    calls = Counter()
+    graph_run = GraphRun({'x': 1, 'w': 'a'}, graph=_toy_graph(calls))
+    assert graph_run.run() == {'parity': 1, 'label': 'odd', 'echoed': 'a'}
+
+    graph_run.update(x=3)
+    assert graph_run.run() == {}
+    # parity saw a new x, but its output is unchanged, so label is not run again
+    assert calls == Counter(parity=2, label=1, echo=1)
+    assert not graph_run.stale
+
+
+def test_generated_code_is_fingerprinted_over_the_answers_it_reads(monkeypatch):
+    assert 'followup_answers' in GENERATOR_GRAPH.nodes['code'].inputs
+    seen = {}
+    monkeypatch.setattr(pipeline, 'incremental_generated_code', lambda state: seen.update(state) or "code")
+
+    pipeline.build_generated_code({'goal': 'g', 'followup_answers': {0: 'CSV exports'}})
+
+    assert seen['follow_up_answers'] == {0: 'CSV exports'}
@@ -0,0 +1,23 @@
+from app.utils.llm_cache import LLMResponseCache
+
+
+def _last_accessed(cache, key):
+    return cache._conn.execute('SELECT last_accessed FROM llm_cache WHERE cache_key = ?', (key,)).fetchone()[0]
+
+
+def test_cache_uses_wal(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.db"))
+    assert cache._conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_hits_rewrite_last_accessed_only_after_the_touch_interval(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.db"), touch_interval=300)
+    cache.set("key", "model", "answer")
+    stored = _last_accessed(cache, "key")
+
+    assert cache.get("key") == "answer"
+    assert _last_accessed(cache, "key") == stored
+
+    cache._conn.execute('UPDATE llm_cache SET last_accessed = last_accessed - 600')
+    assert cache.get("key") == "answer"
+    assert _last_accessed(cache, "key") > stored - 600
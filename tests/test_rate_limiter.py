@@ -0,0 +1,101 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app.utils.rate_limiter import LLMRateLimitError, RateLimiter
+from app.utils.stub_llm_server import start_stub_server
+
+
+class ProviderError(Exception):
+    """An HTTP error shaped like the provider SDK's (status_code, response.headers)"""
+
+    def __init__(self, error: urllib.error.HTTPError):
+        super().__init__(f"HTTP {error.code}")
+        self.status_code = error.code
+        self.response = error
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(faults):
+        server, base_url = start_stub_server({"faults": {"status_codes": [429], "retry_after": 2, **faults}})
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _complete(base_url: str, stream: bool = False):
+    body = json.dumps({"model": "stub-model", "stream": stream,
+                       "messages": [{"role": "user", "content": "hello"}]}).encode("utf-8")
+    request = urllib.request.Request(f"{base_url}/chat/completions", data=body,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        raise ProviderError(e) from e
+
+
+def _limiter(sleeps, **kwargs):
+    return RateLimiter(max_concurrency=8, max_retries=3, sleep=sleeps.append, **kwargs)
+
+
+def test_call_retries_429s_from_the_stub_and_backs_off_the_limit(stub):
+    server, base_url = stub({"fail_first": 2})
+    sleeps = []
+    limiter = _limiter(sleeps)
+
+    assert b"Mock LLM response" in limiter.call(lambda: _complete(base_url))
+
+    metrics = limiter.metrics()
+    assert server.RequestHandlerClass.backend.stats["requests"] == 3
+    assert metrics["throttled"] == 2
+    assert metrics["retries"] == 2
+    assert metrics["succeeded"] == 1
+    # Retry-After: 2 is honoured, plus a little jitter (other sleeps wait on the drained bucket)
+    assert len([delay for delay in sleeps if 2 <= delay <= 2.5]) == 2
+    # AIMD: 4 halved twice to 1, then one success adds 1/limit
+    assert metrics["concurrency_limit"] == 2
+
+
+def test_call_gives_up_after_max_retries(stub):
+    server, base_url = stub({"error_rate": 1.0})
+    limiter = _limiter([])
+
+    with pytest.raises(LLMRateLimitError):
+        limiter.call(lambda: _complete(base_url))
+
+    assert server.RequestHandlerClass.backend.stats["requests"] == 4
+    assert limiter.metrics()["failed"] == 1
+    assert limiter.concurrency.limit == 1
+
+
+def test_stream_retries_429s_before_the_first_chunk(stub):
+    server, base_url = stub({"fail_first": 1})
+    limiter = _limiter([])
+
+    chunks = list(limiter.stream(lambda: [_complete(base_url, stream=True)]))
+
+    assert b"data: [DONE]" in chunks[0]
+    assert server.RequestHandlerClass.backend.stats["requests"] == 2
+    assert limiter.metrics()["retries"] == 1
+
+
+def test_only_successes_grow_the_concurrency_limit():
+    limiter = _limiter([])
+    start = limiter.concurrency.limit
+
+    with pytest.raises(ValueError):
+        limiter.call(lambda: (_ for _ in ()).throw(ValueError("bad request")))
+    assert limiter.concurrency.limit == start
+
+    limiter.call(lambda: "ok")
+    assert limiter.concurrency.limit > start
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from app.utils.startup_benchmark import STARTUP_IMPORT_BUDGET_MS, check_startup
+
+pytest.importorskip("streamlit")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_no_lazy_module_is_imported_eagerly():
+    ok, report = check_startup(budget_ms=float("inf"), cwd=PROJECT_ROOT)
+    assert ok, "\n".join(report)
+
+
+def test_cold_import_stays_within_budget():
+    ok, report = check_startup(budget_ms=STARTUP_IMPORT_BUDGET_MS, cwd=PROJECT_ROOT)
+    assert ok, "\n".join(report)
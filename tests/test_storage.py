@@ -0,0 +1,44 @@
+import threading
+
+from app.utils.storage import get_connection, register_schema, transaction
+
+
+def _create_items(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT)")
+
+
+def _on_thread(target):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_threads_share_one_connection_per_database(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    register_schema(db_path, _create_items)
+
+    first = _on_thread(lambda: get_connection(db_path))
+    second = _on_thread(lambda: get_connection(db_path))
+
+    assert first is second
+    assert get_connection(db_path) is first
+    assert get_connection(str(tmp_path / "other.db")) is not first
+
+
+def test_writes_from_other_threads_are_visible(tmp_path):
+    db_path = str(tmp_path / "writes.db")
+    register_schema(db_path, _create_items)
+
+    def insert(name):
+        with transaction(db_path) as conn:
+            conn.execute("INSERT INTO items (name) VALUES (?)", (name,))
+
+    threads = [threading.Thread(target=insert, args=(f"item-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert get_connection(db_path).execute("SELECT COUNT(*) FROM items").fetchone()[0] == 8
@@ -0,0 +1,14 @@
+from app.utils.token_budget import count_tokens, fit_files, fit_sections
+
+
+def test_fit_sections_budgets_duplicate_names_separately():
+    sections = [('f', 'x' * 100), ('f', 'y' * 100000)]
+    fitted = fit_sections(sections, 500)
+    assert [name for name, _ in fitted] == ['f', 'f']
+    assert fitted[0][1] == 'x' * 100
+    assert sum(count_tokens(text) for _, text in fitted) <= 500
+
+
+def test_fit_files_keeps_order_and_names():
+    files = [{'filename': 'a.csv', 'content': 'a' * 40}, {'filename': 'a.csv', 'content': 'b' * 40}]
+    assert fit_files(files, 1000) == [('a.csv', 'a' * 40), ('a.csv', 'b' * 40)]